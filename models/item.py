@@ -7,10 +7,12 @@ Item model for the recommendation system.
 
 import logging
 from dataclasses import dataclass, field
-from typing import Dict, Optional, List
+from typing import Dict, Iterable, Optional, List
 
+logger = logging.getLogger(__name__)
 
-@dataclass
+
+@dataclass(slots=True)
 class Item:
     """
     Item domain model with essential validation.
@@ -22,15 +24,35 @@ class Item:
     
     def __post_init__(self) -> None:
         """Validate on creation with logging."""
-        self._logger = logging.getLogger(f"{__name__}.{self.__class__.__name__}")
-        
-        self._logger.debug(f"Creating Item with name='{self.name}', id='{self.id}'")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Creating Item with name='%s', id='%s'", self.name, self.id)
         
         if not self.name:
-            self._logger.error(f"Invalid item name: empty name not allowed")
+            logger.error("Invalid item name: empty name not allowed")
             raise ValueError("Item name cannot be empty")
         
-        self._logger.info(f"Item created successfully: {self.name}")
+        logger.info("Item created successfully: %s", self.name)
+    
+    @classmethod
+    def _unchecked(
+        cls,
+        name: str,
+        id: Optional[int],
+        categories: List[str],
+        features: Dict[str, float]
+    ) -> 'Item':
+        """
+        Create an Item without running validation or logging.
+        
+        Only for trusted bulk loaders reading data that was validated
+        before it was saved.
+        """
+        item = cls.__new__(cls)
+        item.name = name
+        item.id = id
+        item.categories = categories
+        item.features = features
+        return item
     
     def add_category(self, category: str) -> None:
         """
@@ -39,10 +61,26 @@ class Item:
         Args:
             category: Category name
         """
-        self._logger.debug(f"Adding category {category} to item {self.name}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Adding category %s to item %s", category, self.name)
         if category not in self.categories:
             self.categories.append(category)
     
+    def add_categories(self, categories: Iterable[str]) -> None:
+        """
+        Add several categories to this item at once.
+        
+        Categories already present, or repeated in categories, are added once.
+        
+        Args:
+            categories: Category names, in order
+        """
+        existing = set(self.categories)
+        new_categories = [c for c in dict.fromkeys(categories) if c not in existing]
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Adding categories %s to item %s", new_categories, self.name)
+        self.categories.extend(new_categories)
+    
     def add_feature(self, feature_name: str, value: float) -> None:
         """
         Add or update a feature value for this item.
@@ -51,7 +89,8 @@ class Item:
             feature_name: Name of the feature
             value: Numeric value for the feature
         """
-        self._logger.debug(f"Adding feature {feature_name}={value} for item {self.name}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Adding feature %s=%s for item %s", feature_name, value, self.name)
         self.features[feature_name] = value
     
     def get_feature_vector(self, feature_names: List[str]) -> List[float]:
@@ -75,8 +114,12 @@ class ItemBuilder:
     Use when Item has many optional parameters or complex feature sets.
     """
     
+    # Shared by all builders; looked up once at class creation
+    _logger = logging.getLogger(f"{__name__}.ItemBuilder")
+    
+    __slots__ = ('_name', '_id', '_categories', '_features')
+    
     def __init__(self) -> None:
-        self._logger = logging.getLogger(f"{__name__}.{self.__class__.__name__}")
         self._logger.debug("ItemBuilder initialized")
         
         self._name: str = ""
@@ -118,5 +161,5 @@ class ItemBuilder:
             categories=self._categories,
             features=self._features
         )
-        self._logger.info(f"Built item: {item.name}")
+        self._logger.info("Built item: %s", item.name)
         return item
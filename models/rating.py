@@ -10,8 +10,10 @@ from dataclasses import dataclass
 from typing import Optional
 from datetime import datetime
 
+logger = logging.getLogger(__name__)
 
-@dataclass
+
+@dataclass(slots=True)
 class Rating:
     """
     Rating domain model with essential validation.
@@ -24,15 +26,40 @@ class Rating:
     
     def __post_init__(self) -> None:
         """Validate on creation with logging."""
-        self._logger = logging.getLogger(f"{__name__}.{self.__class__.__name__}")
-        
-        self._logger.debug(f"Creating Rating: user_id={self.user_id}, item_id={self.item_id}, value={self.value}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(
+                "Creating Rating: user_id=%s, item_id=%s, value=%s",
+                self.user_id, self.item_id, self.value
+            )
         
         if self.value < 0 or self.value > 5:
-            self._logger.error(f"Invalid rating value: {self.value}")
+            logger.error("Invalid rating value: %s", self.value)
             raise ValueError("Rating must be between 0 and 5")
         
         if self.timestamp is None:
             self.timestamp = datetime.now()
             
-        self._logger.info(f"Rating created successfully for user {self.user_id} on item {self.item_id}")
+        logger.info("Rating created successfully for user %s on item %s", self.user_id, self.item_id)
+    
+    @classmethod
+    def _unchecked(
+        cls,
+        user_id: int,
+        item_id: int,
+        value: float,
+        id: Optional[int],
+        timestamp: Optional[datetime]
+    ) -> 'Rating':
+        """
+        Create a Rating without running validation or logging.
+        
+        Only for trusted bulk loaders reading data that was validated
+        before it was saved. A missing timestamp still defaults to now.
+        """
+        rating = cls.__new__(cls)
+        rating.user_id = user_id
+        rating.item_id = item_id
+        rating.value = value
+        rating.id = id
+        rating.timestamp = timestamp if timestamp is not None else datetime.now()
+        return rating
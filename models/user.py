@@ -7,30 +7,60 @@ User model for the recommendation system.
 
 import logging
 from dataclasses import dataclass, field
-from typing import Dict, List, Optional
+from typing import Dict, Iterable, List, Optional, Set
 
+logger = logging.getLogger(__name__)
 
-@dataclass
+
+@dataclass(slots=True)
 class User:
     """
     User domain model with essential validation.
+    
+    history must only be changed through add_to_history and extend_history:
+    membership is tracked in a set alongside it, which does not see direct
+    changes to the list or a reassigned list.
     """
     username: str
     id: Optional[int] = None
     preferences: Dict[str, float] = field(default_factory=dict)
     history: List[int] = field(default_factory=list)
+    _history_set: Set[int] = field(init=False, repr=False, compare=False)  # items in history
     
     def __post_init__(self) -> None:
         """Validate on creation with logging."""
-        self._logger = logging.getLogger(f"{__name__}.{self.__class__.__name__}")
-        
-        self._logger.debug(f"Creating User with username='{self.username}', id='{self.id}'")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Creating User with username='%s', id='%s'", self.username, self.id)
         
         if not self.username or len(self.username) < 3:
-            self._logger.error(f"Invalid username length: '{self.username}' (must be 3+ characters)")
+            logger.error("Invalid username length: '%s' (must be 3+ characters)", self.username)
             raise ValueError("Username must be 3+ characters")
         
-        self._logger.info(f"User created successfully: {self.username}")
+        self._history_set = set(self.history)
+        
+        logger.info("User created successfully: %s", self.username)
+    
+    @classmethod
+    def _unchecked(
+        cls,
+        username: str,
+        id: Optional[int],
+        preferences: Dict[str, float],
+        history: List[int]
+    ) -> 'User':
+        """
+        Create a User without running validation or logging.
+        
+        Only for trusted bulk loaders reading data that was validated
+        before it was saved.
+        """
+        user = cls.__new__(cls)
+        user.username = username
+        user.id = id
+        user.preferences = preferences
+        user.history = history
+        user._history_set = set(history)
+        return user
     
     def add_preference(self, category: str, weight: float) -> None:
         """
@@ -41,10 +71,11 @@ class User:
             weight: Preference weight (0-1)
         """
         if weight < 0 or weight > 1:
-            self._logger.error(f"Invalid preference weight: {weight}")
+            logger.error("Invalid preference weight: %s", weight)
             raise ValueError("Preference weight must be between 0 and 1")
         
-        self._logger.debug(f"Adding preference {category}={weight} for user {self.username}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Adding preference %s=%s for user %s", category, weight, self.username)
         self.preferences[category] = weight
     
     def add_to_history(self, item_id: int) -> None:
@@ -54,9 +85,26 @@ class User:
         Args:
             item_id: ID of the item the user interacted with
         """
-        self._logger.debug(f"Adding item {item_id} to history for user {self.username}")
-        if item_id not in self.history:
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Adding item %s to history for user %s", item_id, self.username)
+        if item_id not in self._history_set:
+            self._history_set.add(item_id)
             self.history.append(item_id)
+    
+    def extend_history(self, item_ids: Iterable[int]) -> None:
+        """
+        Add several items to the user's history at once.
+        
+        Items already in the history, or repeated in item_ids, are added once.
+        
+        Args:
+            item_ids: IDs of the items the user interacted with, in order
+        """
+        new_ids = [item_id for item_id in dict.fromkeys(item_ids) if item_id not in self._history_set]
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Adding %s items to history for user %s", len(new_ids), self.username)
+        self.history.extend(new_ids)
+        self._history_set.update(new_ids)
 
 
 class UserBuilder:
@@ -67,8 +115,12 @@ class UserBuilder:
     Use when User has many optional parameters or complex validation.
     """
     
+    # Shared by all builders; looked up once at class creation
+    _logger = logging.getLogger(f"{__name__}.UserBuilder")
+    
+    __slots__ = ('_username', '_id', '_preferences', '_history')
+    
     def __init__(self) -> None:
-        self._logger = logging.getLogger(f"{__name__}.{self.__class__.__name__}")
         self._logger.debug("UserBuilder initialized")
         
         self._username: str = ""
@@ -109,5 +161,5 @@ class UserBuilder:
             preferences=self._preferences,
             history=self._history
         )
-        self._logger.info(f"Built user: {user.username}")
+        self._logger.info("Built user: %s", user.username)
         return user
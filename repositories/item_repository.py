@@ -5,11 +5,15 @@
 Item repository for data access.
 """
 
+import io
 import os
+import bisect
 import csv
-import json
 import logging
-from typing import List, Dict, Optional
+import numpy as np
+import orjson
+import pandas as pd
+from typing import BinaryIO, Callable, List, Dict, Optional, Tuple, Union
 from models.item import Item
 
 
@@ -17,8 +21,18 @@ class ItemRepository:
     """
     Repository for Item data access.
     Handles loading, saving, and querying item data.
+    
+    Every save/delete is written to disk immediately, unless the
+    repository is used as a context manager, in which case changes are
+    written once on exit:
+    
+        with item_repository:
+            for item in new_items:
+                item_repository.save(item)
     """
     
+    FIELDNAMES = ['id', 'name', 'categories', 'features']
+    
     def __init__(self, data_path: str = './data'):
         """
         Initialize the item repository.
@@ -31,6 +45,27 @@ class ItemRepository:
         self.items_file = os.path.join(data_path, 'items.csv')
         self.items: Dict[int, Item] = {}
         
+        # Next ID to hand out, computed from items on first use
+        self._next_id: Optional[int] = None
+        
+        # Columnar (struct-of-arrays) feature store, built lazily from items
+        self._ids: Optional[np.ndarray] = None
+        self._row_of: Dict[int, int] = {}
+        self._feature_index: Dict[str, int] = {}
+        self._feature_matrix: Optional[np.ndarray] = None
+        self._feature_matrix_cache: Dict[Tuple[str, ...], np.ndarray] = {}
+        
+        # Reverse index from category to item IDs, built lazily from items;
+        # each list is kept sorted by the items' insertion order
+        self._category_index: Optional[Dict[str, List[int]]] = None
+        self._indexed_categories: Dict[int, Tuple[str, ...]] = {}
+        self._item_order: Dict[int, int] = {}
+        self._next_order = 0
+        
+        # Write-behind state: while batching, mutations only mark the file dirty
+        self._autoflush = True
+        self._dirty = False
+        
         # Create data directory if it doesn't exist
         os.makedirs(data_path, exist_ok=True)
         
@@ -40,42 +75,64 @@ class ItemRepository:
     
     def _load_items(self) -> None:
         """Load items from CSV file."""
+        self._logger.info(f"Loading items from {self.items_file}")
+        self._load_from_stream(self.items_file)
+    
+    def _load_from_stream(self, stream: Union[str, BinaryIO]) -> None:
+        """
+        Load items from CSV data, replacing the current items.
+        
+        Args:
+            stream: Binary file-like object, or path of a CSV file to memory-map
+        """
         try:
-            self._logger.info(f"Loading items from {self.items_file}")
             self.items = {}
+            self._next_id = None
+            self._invalidate_feature_store()
+            self._category_index = None
+            
+            # Parse in C, memory-mapping files; JSON columns are kept as raw strings
+            df = pd.read_csv(
+                stream,
+                dtype=str,
+                keep_default_na=False,
+                encoding='utf-8',
+                memory_map=isinstance(stream, str)
+            ).reindex(columns=self.FIELDNAMES, fill_value='')
             
-            with open(self.items_file, 'r', newline='', encoding='utf-8') as csvfile:
-                reader = csv.DictReader(csvfile)
-                for row in reader:
-                    item_id = int(row['id'])
-                    name = row['name']
-                    
-                    # Parse categories and features if present
-                    categories = []
-                    if row.get('categories'):
-                        try:
-                            categories = json.loads(row['categories'])
-                        except json.JSONDecodeError:
-                            self._logger.warning(f"Invalid categories JSON for item {item_id}")
-                    
-                    features = {}
-                    if row.get('features'):
-                        try:
-                            features = json.loads(row['features'])
-                            # Convert string keys back to float values
+            ids = df['id'].astype('int64').tolist()
+            names = df['name'].tolist()
+            
+            for item_id, name, raw_categories, raw_features in zip(
+                ids, names, df['categories'].tolist(), df['features'].tolist()
+            ):
+                # Parse categories and features if present
+                categories = []
+                if raw_categories:
+                    try:
+                        categories = orjson.loads(raw_categories)
+                    except orjson.JSONDecodeError:
+                        self._logger.warning(f"Invalid categories JSON for item {item_id}")
+                
+                features = {}
+                if raw_features:
+                    try:
+                        features = orjson.loads(raw_features)
+                        # Files written by older versions hold values as strings
+                        if any(isinstance(v, str) for v in features.values()):
                             features = {k: float(v) for k, v in features.items()}
-                        except (json.JSONDecodeError, ValueError):
-                            self._logger.warning(f"Invalid features JSON for item {item_id}")
-                    
-                    # Create item object
-                    item = Item(
-                        name=name,
-                        id=item_id,
-                        categories=categories,
-                        features=features
-                    )
-                    self.items[item_id] = item
-                    
+                    except (orjson.JSONDecodeError, ValueError):
+                        self._logger.warning(f"Invalid features JSON for item {item_id}")
+                
+                # Create item object
+                item = Item._unchecked(
+                    name=name,
+                    id=item_id,
+                    categories=categories,
+                    features=features
+                )
+                self.items[item_id] = item
+                
             self._logger.info(f"Loaded {len(self.items)} items")
         
         except Exception as e:
@@ -88,24 +145,58 @@ class ItemRepository:
         try:
             self._logger.info(f"Saving items to {self.items_file}")
             
-            with open(self.items_file, 'w', newline='', encoding='utf-8') as csvfile:
-                fieldnames = ['id', 'name', 'categories', 'features']
-                writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-                writer.writeheader()
-                
-                for item in self.items.values():
-                    writer.writerow({
-                        'id': item.id,
-                        'name': item.name,
-                        'categories': json.dumps(item.categories),
-                        'features': json.dumps({k: str(v) for k, v in item.features.items()})
-                    })
+            # Build the file in memory, write it in one call and swap it in,
+            # so a failed save never leaves a partial file behind
+            buffer = io.BytesIO()
+            self._dump_to_stream(buffer)
+            temp_file = f"{self.items_file}.tmp"
+            with open(temp_file, 'wb') as f:
+                f.write(buffer.getbuffer())
+            os.replace(temp_file, self.items_file)
             
+            self._dirty = False
             self._logger.info(f"Saved {len(self.items)} items")
         
         except Exception as e:
             self._logger.error(f"Error saving items: {e}")
     
+    def _dump_to_stream(self, stream: BinaryIO) -> None:
+        """
+        Write all items as CSV data.
+        
+        Args:
+            stream: Binary file-like object to write to; it is left open
+        """
+        csvfile = io.TextIOWrapper(stream, encoding='utf-8', newline='')
+        writer = csv.DictWriter(csvfile, fieldnames=self.FIELDNAMES)
+        writer.writeheader()
+        
+        for item in self.items.values():
+            writer.writerow({
+                'id': item.id,
+                'name': item.name,
+                'categories': orjson.dumps(item.categories).decode(),
+                'features': orjson.dumps(item.features, option=orjson.OPT_SERIALIZE_NUMPY).decode()
+            })
+        
+        csvfile.flush()
+        csvfile.detach()
+    
+    def flush(self) -> None:
+        """Write pending changes to the CSV file, if there are any."""
+        if self._dirty:
+            self.save_all()
+    
+    def __enter__(self) -> 'ItemRepository':
+        """Start batching changes until the block exits."""
+        self._autoflush = False
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        """Stop batching and write the accumulated changes once."""
+        self._autoflush = True
+        self.flush()
+    
     def get_all(self) -> List[Item]:
         """
         Get all items.
@@ -140,10 +231,113 @@ class ItemRepository:
         Returns:
             List of items in the category
         """
-        return [
-            item for item in self.items.values()
-            if category in item.categories
+        self._ensure_category_index()
+        return [self.items[item_id] for item_id in self._category_index.get(category, ())]
+    
+    def get_feature_names(self) -> List[str]:
+        """
+        Get the feature names backing the columns of the feature matrix.
+        
+        Returns:
+            List of feature names in column order
+        """
+        self._ensure_feature_store()
+        return list(self._feature_index)
+    
+    def get_item_ids(self) -> np.ndarray:
+        """
+        Get the item IDs backing the rows of the feature matrix.
+        
+        Returns:
+            Array of item IDs in row order
+        """
+        self._ensure_feature_store()
+        return self._ids
+    
+    def get_feature_matrix(self) -> np.ndarray:
+        """
+        Get the dense item-feature matrix.
+        
+        Rows follow get_item_ids() and columns follow get_feature_names().
+        Missing features are stored as 0.
+        
+        Returns:
+            Array of shape (n_items, n_features) with float32 values
+        """
+        self._ensure_feature_store()
+        return self._feature_matrix
+    
+    def build_feature_matrix(self, feature_names: List[str]) -> np.ndarray:
+        """
+        Get a dense item-feature matrix with columns in the given order.
+        
+        The result is cached per feature list until the next save or delete.
+        Features no item has are returned as zero columns.
+        
+        Args:
+            feature_names: Feature names in desired column order
+            
+        Returns:
+            Array of shape (n_items, len(feature_names)) with rows following get_item_ids()
+        """
+        key = tuple(feature_names)
+        matrix = self._feature_matrix_cache.get(key)
+        if matrix is not None:
+            return matrix
+        
+        self._ensure_feature_store()
+        matrix = np.zeros((len(self._ids), len(key)), dtype=np.float32)
+        columns = [
+            (col, self._feature_index[name])
+            for col, name in enumerate(key)
+            if name in self._feature_index
         ]
+        if columns:
+            dst, src = zip(*columns)
+            matrix[:, list(dst)] = self._feature_matrix[:, list(src)]
+        
+        self._feature_matrix_cache[key] = matrix
+        return matrix
+    
+    def make_feature_extractor(self, feature_names: List[str]) -> Callable[[int], Optional[np.ndarray]]:
+        """
+        Create a fast lookup of item feature vectors for a fixed feature list.
+        
+        Column positions are resolved once, so each call is a single row
+        read from a caller-ordered matrix. The extractor is a snapshot: it
+        does not see items saved or deleted after it was created.
+        
+        Args:
+            feature_names: Feature names in desired vector order
+            
+        Returns:
+            Function mapping an item ID to its feature vector, or None if not found
+        """
+        matrix = self.build_feature_matrix(feature_names)
+        row_of = dict(self._row_of)
+        
+        def extract(item_id: int) -> Optional[np.ndarray]:
+            row = row_of.get(item_id)
+            return None if row is None else matrix[row]
+        
+        return extract
+    
+    def get_feature_vector(self, item_id: int) -> Optional[np.ndarray]:
+        """
+        Get the feature row of a single item.
+        
+        Args:
+            item_id: Item ID
+            
+        Returns:
+            Feature row (a view into the feature matrix) if found, None otherwise
+        """
+        self._ensure_feature_store()
+        row = self._row_of.get(item_id)
+        if row is None:
+            self._logger.debug(f"Item not found: {item_id}")
+            return None
+        return self._feature_matrix[row]
     
     def save(self, item: Item) -> Item:
         """
@@ -158,12 +352,17 @@ class ItemRepository:
         # Assign ID if not present
         if item.id is None:
             item.id = self._get_next_id()
+        elif self._next_id is not None and item.id >= self._next_id:
+            self._next_id = item.id + 1
         
         self._logger.debug(f"Saving item {item.name} with ID {item.id}")
         self.items[item.id] = item
+        self._invalidate_feature_store()
+        if self._category_index is not None:
+            self._index_categories(item)
         
         # Save to file
-        self.save_all()
+        self._mark_dirty()
         
         return item
     
@@ -180,12 +379,21 @@ class ItemRepository:
         if item_id in self.items:
             self._logger.debug(f"Deleting item {item_id}")
             del self.items[item_id]
-            self.save_all()
+            self._invalidate_feature_store()
+            if self._category_index is not None:
+                self._unindex_categories(item_id)
+            self._mark_dirty()
             return True
         else:
             self._logger.debug(f"Item not found for deletion: {item_id}")
             return False
     
+    def _mark_dirty(self) -> None:
+        """Record an unsaved change and write it unless batching."""
+        self._dirty = True
+        if self._autoflush:
+            self.flush()
+    
     def _get_next_id(self) -> int:
         """
         Generate next item ID.
@@ -193,6 +401,91 @@ class ItemRepository:
         Returns:
             Next available item ID
         """
-        if not self.items:
-            return 1
-        return max(self.items.keys()) + 1
+        if self._next_id is None:
+            self._next_id = max(self.items.keys(), default=0) + 1
+        
+        next_id = self._next_id
+        self._next_id += 1
+        return next_id
+    
+    def _ensure_category_index(self) -> None:
+        """Build the category reverse index from the current items if needed."""
+        if self._category_index is not None:
+            return
+        
+        self._category_index = {}
+        self._indexed_categories = {}
+        self._item_order = {}
+        self._next_order = 0
+        for item in self.items.values():
+            self._index_categories(item)
+    
+    def _index_categories(self, item: Item) -> None:
+        """
+        Bring the category index in line with an item's current categories.
+        
+        Args:
+            item: Item that was added or modified
+        """
+        # Items keep their insertion position for as long as they are not deleted
+        if item.id not in self._item_order:
+            self._item_order[item.id] = self._next_order
+            self._next_order += 1
+        
+        old_categories = set(self._indexed_categories.get(item.id, ()))
+        new_categories = set(item.categories)
+        
+        for category in old_categories - new_categories:
+            self._remove_from_category(category, item.id)
+        for category in new_categories - old_categories:
+            item_ids = self._category_index.setdefault(category, [])
+            bisect.insort(item_ids, item.id, key=self._item_order.__getitem__)
+        
+        self._indexed_categories[item.id] = tuple(item.categories)
+    
+    def _unindex_categories(self, item_id: int) -> None:
+        """
+        Remove an item from the category index.
+        
+        Args:
+            item_id: ID of the deleted item
+        """
+        for category in set(self._indexed_categories.pop(item_id, ())):
+            self._remove_from_category(category, item_id)
+        self._item_order.pop(item_id, None)
+    
+    def _remove_from_category(self, category: str, item_id: int) -> None:
+        """
+        Remove an item from one category's list in the index.
+        
+        Args:
+            category: Category name
+            item_id: ID of the item to remove
+        """
+        item_ids = self._category_index[category]
+        position = self._item_order.__getitem__
+        del item_ids[bisect.bisect_left(item_ids, position(item_id), key=position)]
+    
+    def _invalidate_feature_store(self) -> None:
+        """Drop the columnar feature store so it is rebuilt on next access."""
+        self._feature_matrix = None
+        self._feature_matrix_cache = {}
+    
+    def _ensure_feature_store(self) -> None:
+        """Build the columnar feature store from the current items if needed."""
+        if self._feature_matrix is not None:
+            return
+        
+        items = list(self.items.values())
+        feature_names = sorted({name for item in items for name in item.features})
+        self._feature_index = {name: col for col, name in enumerate(feature_names)}
+        self._row_of = {item.id: row for row, item in enumerate(items)}
+        self._ids = np.fromiter(self._row_of, dtype=np.int64, count=len(items))
+        
+        matrix = np.zeros((len(items), len(feature_names)), dtype=np.float32)
+        for row, item in enumerate(items):
+            for name, value in item.features.items():
+                matrix[row, self._feature_index[name]] = value
+        self._feature_matrix = matrix
+        
+        self._logger.debug(f"Built feature matrix with shape {matrix.shape}")
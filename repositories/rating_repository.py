@@ -5,20 +5,44 @@
 Rating repository for data access.
 """
 
+import io
 import os
+import bisect
 import csv
 import logging
-from typing import List, Dict, Optional
+import pandas as pd
+from typing import BinaryIO, List, Dict, Optional, Tuple, Union
 from datetime import datetime
 from models.rating import Rating
 
+try:
+    # Optional: pyarrow's CSV reader parses blocks on multiple threads
+    import pyarrow  # noqa: F401
+    _CSV_READ_OPTIONS = {'engine': 'pyarrow'}
+except ImportError:
+    _CSV_READ_OPTIONS = {'memory_map': True}
+
 
 class RatingRepository:
     """
     Repository for Rating data access.
     Handles loading, saving, and querying rating data.
+    
+    New and updated ratings are appended to the CSV file; a later row for
+    the same rating ID supersedes earlier ones on load. The file is
+    compacted once superseded rows outnumber live ratings.
+    
+    Every save/delete is written to disk immediately, unless the
+    repository is used as a context manager, in which case changes are
+    written once on exit:
+    
+        with rating_repository:
+            for rating in new_ratings:
+                rating_repository.save(rating)
     """
     
+    FIELDNAMES = ['id', 'user_id', 'item_id', 'value', 'timestamp']
+    
     def __init__(self, data_path: str = './data'):
         """
         Initialize the rating repository.
@@ -31,6 +55,27 @@ class RatingRepository:
         self.ratings_file = os.path.join(data_path, 'ratings.csv')
         self.ratings: Dict[int, Rating] = {}
         
+        # Next ID to hand out, computed from ratings on first use
+        self._next_id: Optional[int] = None
+        
+        # Lookup indexes over rating IDs, built lazily from ratings; each
+        # list is kept sorted by the ratings' file order
+        self._by_user: Dict[int, List[int]] = {}
+        self._by_item: Dict[int, List[int]] = {}
+        self._by_pair: Optional[Dict[Tuple[int, int], List[int]]] = None
+        self._pair_of: Dict[int, Tuple[int, int]] = {}
+        self._rating_order: Dict[int, int] = {}
+        self._next_order = 0
+        
+        # Number of data rows currently in the CSV file, including superseded ones
+        self._file_rows = 0
+        
+        # Write-behind state: ratings waiting to be appended (by ID), and
+        # whether a full rewrite is needed (after a delete)
+        self._autoflush = True
+        self._pending: Dict[int, Rating] = {}
+        self._dirty = False
+        
         # Create data directory if it doesn't exist
         os.makedirs(data_path, exist_ok=True)
         
@@ -40,36 +85,67 @@ class RatingRepository:
     
     def _load_ratings(self) -> None:
         """Load ratings from CSV file."""
+        self._logger.info(f"Loading ratings from {self.ratings_file}")
+        self._load_from_stream(self.ratings_file)
+    
+    def _load_from_stream(self, stream: Union[str, BinaryIO]) -> None:
+        """
+        Load ratings from CSV data, replacing the current ratings.
+        
+        Args:
+            stream: Binary file-like object, or path of a CSV file
+        """
         try:
-            self._logger.info(f"Loading ratings from {self.ratings_file}")
             self.ratings = {}
+            self._next_id = None
+            self._by_pair = None
+            self._file_rows = 0
+            
+            # Parse the whole file with typed columns, multi-threaded when
+            # pyarrow is installed and memory-mapped in C otherwise; streams
+            # cannot be memory-mapped and always use the C parser
+            df = pd.read_csv(
+                stream,
+                dtype={
+                    'id': 'int64',
+                    'user_id': 'int64',
+                    'item_id': 'int64',
+                    'value': 'float64',
+                    'timestamp': str
+                },
+                keep_default_na=False,
+                encoding='utf-8',
+                **(_CSV_READ_OPTIONS if isinstance(stream, str) else {})
+            ).reindex(columns=self.FIELDNAMES, fill_value='')
+            self._file_rows = len(df)
             
-            with open(self.ratings_file, 'r', newline='', encoding='utf-8') as csvfile:
-                reader = csv.DictReader(csvfile)
-                for row in reader:
-                    rating_id = int(row['id'])
-                    user_id = int(row['user_id'])
-                    item_id = int(row['item_id'])
-                    value = float(row['value'])
-                    
-                    # Parse timestamp if present
-                    timestamp = None
-                    if row.get('timestamp'):
-                        try:
-                            timestamp = datetime.fromisoformat(row['timestamp'])
-                        except ValueError:
-                            self._logger.warning(f"Invalid timestamp format for rating {rating_id}")
-                    
-                    # Create rating object
-                    rating = Rating(
-                        user_id=user_id,
-                        item_id=item_id,
-                        value=value,
-                        id=rating_id,
-                        timestamp=timestamp
-                    )
-                    self.ratings[rating_id] = rating
-                    
+            # Parse timestamps in one vectorized pass; blank or invalid values become NaT
+            raw_timestamps = df['timestamp']
+            timestamps = pd.to_datetime(raw_timestamps, errors='coerce', format='ISO8601')
+            for rating_id in df.loc[timestamps.isna() & (raw_timestamps != ''), 'id']:
+                self._logger.warning(f"Invalid timestamp format for rating {rating_id}")
+            
+            # Convert to datetime objects in bulk, with NaT as None
+            py_timestamps = pd.DatetimeIndex(timestamps).to_pydatetime()
+            py_timestamps[timestamps.isna().to_numpy()] = None
+            
+            for rating_id, user_id, item_id, value, timestamp in zip(
+                df['id'].tolist(),
+                df['user_id'].tolist(),
+                df['item_id'].tolist(),
+                df['value'].tolist(),
+                py_timestamps.tolist()
+            ):
+                # Create rating object
+                rating = Rating._unchecked(
+                    user_id=user_id,
+                    item_id=item_id,
+                    value=value,
+                    id=rating_id,
+                    timestamp=timestamp
+                )
+                self.ratings[rating_id] = rating
+                
             self._logger.info(f"Loaded {len(self.ratings)} ratings")
         
         except Exception as e:
@@ -82,29 +158,102 @@ class RatingRepository:
         try:
             self._logger.info(f"Saving ratings to {self.ratings_file}")
             
-            with open(self.ratings_file, 'w', newline='', encoding='utf-8') as csvfile:
-                fieldnames = ['id', 'user_id', 'item_id', 'value', 'timestamp']
-                writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-                writer.writeheader()
-                
-                for rating in self.ratings.values():
-                    timestamp_str = ''
-                    if rating.timestamp:
-                        timestamp_str = rating.timestamp.isoformat()
-                        
-                    writer.writerow({
-                        'id': rating.id,
-                        'user_id': rating.user_id,
-                        'item_id': rating.item_id,
-                        'value': rating.value,
-                        'timestamp': timestamp_str
-                    })
+            # Build the file in memory, write it in one call and swap it in,
+            # so a failed save never leaves a partial file behind
+            buffer = io.BytesIO()
+            self._dump_to_stream(buffer)
+            temp_file = f"{self.ratings_file}.tmp"
+            with open(temp_file, 'wb') as f:
+                f.write(buffer.getbuffer())
+            os.replace(temp_file, self.ratings_file)
             
+            self._file_rows = len(self.ratings)
+            self._pending = {}
+            self._dirty = False
             self._logger.info(f"Saved {len(self.ratings)} ratings")
         
         except Exception as e:
             self._logger.error(f"Error saving ratings: {e}")
     
+    def _dump_to_stream(self, stream: BinaryIO) -> None:
+        """
+        Write all ratings as CSV data.
+        
+        Args:
+            stream: Binary file-like object to write to; it is left open
+        """
+        csvfile = io.TextIOWrapper(stream, encoding='utf-8', newline='')
+        writer = csv.DictWriter(csvfile, fieldnames=self.FIELDNAMES)
+        writer.writeheader()
+        writer.writerows(self._to_row(rating) for rating in self.ratings.values())
+        
+        csvfile.flush()
+        csvfile.detach()
+    
+    def flush(self) -> None:
+        """Write pending changes to the CSV file, if there are any."""
+        if self._dirty:
+            self.save_all()
+        elif self._pending:
+            self._append_pending()
+    
+    def __enter__(self) -> 'RatingRepository':
+        """Start batching changes until the block exits."""
+        self._autoflush = False
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        """Stop batching and write the accumulated changes once."""
+        self._autoflush = True
+        self.flush()
+    
+    def _append_pending(self) -> None:
+        """
+        Append the pending ratings to the CSV file.
+        
+        Falls back to a full rewrite when the file does not exist yet or
+        when superseded rows would outnumber live ratings.
+        """
+        stale_rows = self._file_rows + len(self._pending) - len(self.ratings)
+        if not os.path.exists(self.ratings_file) or stale_rows > len(self.ratings):
+            self.save_all()
+            return
+        
+        try:
+            self._logger.debug(f"Appending {len(self._pending)} ratings to {self.ratings_file}")
+            
+            with open(self.ratings_file, 'a', newline='', encoding='utf-8') as csvfile:
+                writer = csv.DictWriter(csvfile, fieldnames=self.FIELDNAMES)
+                writer.writerows(self._to_row(rating) for rating in self._pending.values())
+            
+            self._file_rows += len(self._pending)
+            self._pending = {}
+        
+        except Exception as e:
+            self._logger.error(f"Error appending ratings: {e}")
+    
+    def _to_row(self, rating: Rating) -> Dict[str, object]:
+        """
+        Convert a rating to a CSV row.
+        
+        Args:
+            rating: Rating to convert
+            
+        Returns:
+            Dictionary keyed by FIELDNAMES
+        """
+        timestamp_str = ''
+        if rating.timestamp:
+            timestamp_str = rating.timestamp.isoformat()
+        
+        return {
+            'id': rating.id,
+            'user_id': rating.user_id,
+            'item_id': rating.item_id,
+            'value': rating.value,
+            'timestamp': timestamp_str
+        }
+    
     def get_all(self) -> List[Rating]:
         """
         Get all ratings.
@@ -139,10 +288,8 @@ class RatingRepository:
         Returns:
             List of ratings for the specified user
         """
-        return [
-            rating for rating in self.ratings.values()
-            if rating.user_id == user_id
-        ]
+        self._ensure_indexes()
+        return [self.ratings[rating_id] for rating_id in self._by_user.get(user_id, ())]
     
     def get_by_item_id(self, item_id: int) -> List[Rating]:
         """
@@ -154,10 +301,8 @@ class RatingRepository:
         Returns:
             List of ratings for the specified item
         """
-        return [
-            rating for rating in self.ratings.values()
-            if rating.item_id == item_id
-        ]
+        self._ensure_indexes()
+        return [self.ratings[rating_id] for rating_id in self._by_item.get(item_id, ())]
     
     def get_by_user_and_item(self, user_id: int, item_id: int) -> Optional[Rating]:
         """
@@ -170,10 +315,11 @@ class RatingRepository:
         Returns:
             Rating object if found, None otherwise
         """
-        for rating in self.ratings.values():
-            if rating.user_id == user_id and rating.item_id == item_id:
-                return rating
-        return None
+        self._ensure_indexes()
+        rating_ids = self._by_pair.get((user_id, item_id))
+        if not rating_ids:
+            return None
+        return self.ratings.get(rating_ids[0])
     
     def save(self, rating: Rating) -> Rating:
         """
@@ -197,12 +343,17 @@ class RatingRepository:
             # Assign ID if not present
             if rating.id is None:
                 rating.id = self._get_next_id()
+            elif self._next_id is not None and rating.id >= self._next_id:
+                self._next_id = rating.id + 1
             
             self._logger.debug(f"Saving new rating with ID {rating.id}")
             self.ratings[rating.id] = rating
+            self._index_rating(rating)
         
-        # Save to file
-        self.save_all()
+        # Append to file
+        self._pending[rating.id] = rating
+        if self._autoflush:
+            self.flush()
         
         return rating
     
@@ -219,7 +370,11 @@ class RatingRepository:
         if rating_id in self.ratings:
             self._logger.debug(f"Deleting rating {rating_id}")
             del self.ratings[rating_id]
-            self.save_all()
+            if self._by_pair is not None:
+                self._unindex_rating(rating_id)
+            self._dirty = True
+            if self._autoflush:
+                self.flush()
             return True
         else:
             self._logger.debug(f"Rating not found for deletion: {rating_id}")
@@ -232,6 +387,74 @@ class RatingRepository:
         Returns:
             Next available rating ID
         """
-        if not self.ratings:
-            return 1
-        return max(self.ratings.keys()) + 1
+        if self._next_id is None:
+            self._next_id = max(self.ratings.keys(), default=0) + 1
+        
+        next_id = self._next_id
+        self._next_id += 1
+        return next_id
+    
+    def _ensure_indexes(self) -> None:
+        """Build the user, item and (user, item) indexes if needed."""
+        if self._by_pair is not None:
+            return
+        
+        self._by_user = {}
+        self._by_item = {}
+        self._by_pair = {}
+        self._pair_of = {}
+        self._rating_order = {}
+        self._next_order = 0
+        for rating in self.ratings.values():
+            self._index_rating(rating)
+    
+    def _index_rating(self, rating: Rating) -> None:
+        """
+        Add or move a rating in the lookup indexes.
+        
+        Args:
+            rating: Rating that was added or modified
+        """
+        pair = (rating.user_id, rating.item_id)
+        old_pair = self._pair_of.get(rating.id)
+        if old_pair == pair:
+            return
+        
+        # Ratings keep their file position for as long as they are not deleted
+        if old_pair is None:
+            self._rating_order[rating.id] = self._next_order
+            self._next_order += 1
+        else:
+            self._remove_from_indexes(rating.id, old_pair)
+        
+        self._pair_of[rating.id] = pair
+        position = self._rating_order.__getitem__
+        for index, key in ((self._by_pair, pair), (self._by_user, rating.user_id), (self._by_item, rating.item_id)):
+            bisect.insort(index.setdefault(key, []), rating.id, key=position)
+    
+    def _unindex_rating(self, rating_id: int) -> None:
+        """
+        Remove a rating from the lookup indexes.
+        
+        Args:
+            rating_id: Rating ID
+        """
+        pair = self._pair_of.pop(rating_id, None)
+        if pair is None:
+            return
+        
+        self._remove_from_indexes(rating_id, pair)
+        del self._rating_order[rating_id]
+    
+    def _remove_from_indexes(self, rating_id: int, pair: Tuple[int, int]) -> None:
+        """
+        Remove a rating from the index lists of its (user, item) pair.
+        
+        Args:
+            rating_id: Rating ID
+            pair: (user_id, item_id) the rating is indexed under
+        """
+        position = self._rating_order.__getitem__
+        user_id, item_id = pair
+        for rating_ids in (self._by_pair[pair], self._by_user[user_id], self._by_item[item_id]):
+            del rating_ids[bisect.bisect_left(rating_ids, position(rating_id), key=position)]
@@ -5,11 +5,13 @@
 User repository for data access.
 """
 
+import io
 import os
-import csv
-import json
+import mmap
 import logging
-from typing import List, Dict, Optional
+import orjson
+import pandas as pd
+from typing import Any, BinaryIO, List, Dict, Optional, Union
 from models.user import User
 
 
@@ -17,8 +19,15 @@ class UserRepository:
     """
     Repository for User data access.
     Handles loading, saving, and querying user data.
+    
+    Individual saves and deletes are appended to a journal (users.wal)
+    rather than rewriting users.csv. On load the journal is replayed on
+    top of the CSV file; it is folded back into the CSV by compact(),
+    automatically once it holds more entries than there are users.
     """
     
+    FIELDNAMES = ['id', 'username', 'preferences', 'history']
+    
     def __init__(self, data_path: str = './data'):
         """
         Initialize the user repository.
@@ -29,51 +38,91 @@ class UserRepository:
         self._logger = logging.getLogger(f"{__name__}.{self.__class__.__name__}")
         self.data_path = data_path
         self.users_file = os.path.join(data_path, 'users.csv')
+        self.journal_file = os.path.join(data_path, 'users.wal')
         self.users: Dict[int, User] = {}
         
+        # Next ID to hand out, computed from users on first use
+        self._next_id: Optional[int] = None
+        
+        # Number of operations in the journal not yet folded into the CSV file
+        self._journal_ops = 0
+        
         # Create data directory if it doesn't exist
         os.makedirs(data_path, exist_ok=True)
         
         # Load data if file exists
         if os.path.exists(self.users_file):
             self._load_users()
+        if os.path.exists(self.journal_file):
+            self._replay_journal()
     
     def _load_users(self) -> None:
         """Load users from CSV file."""
+        self._logger.info(f"Loading users from {self.users_file}")
+        self._load_from_stream(self.users_file)
+    
+    def _load_from_stream(self, stream: Union[str, BinaryIO]) -> None:
+        """
+        Load users from CSV data, replacing the current users.
+        
+        Args:
+            stream: Binary file-like object, or path of a CSV file to memory-map
+        """
         try:
-            self._logger.info(f"Loading users from {self.users_file}")
             self.users = {}
+            self._next_id = None
             
-            with open(self.users_file, 'r', newline='', encoding='utf-8') as csvfile:
-                reader = csv.DictReader(csvfile)
-                for row in reader:
-                    user_id = int(row['id'])
-                    username = row['username']
-                    
-                    # Parse preferences and history if present
-                    preferences = {}
-                    if row.get('preferences'):
-                        try:
-                            preferences = json.loads(row['preferences'])
-                        except json.JSONDecodeError:
-                            self._logger.warning(f"Invalid preferences JSON for user {user_id}")
-                    
-                    history = []
-                    if row.get('history'):
-                        try:
-                            history = [int(x) for x in json.loads(row['history'])]
-                        except (json.JSONDecodeError, ValueError):
-                            self._logger.warning(f"Invalid history JSON for user {user_id}")
-                    
-                    # Create user object
-                    user = User(
-                        username=username,
-                        id=user_id,
-                        preferences=preferences,
-                        history=history
-                    )
-                    self.users[user_id] = user
-                    
+            # Parse in C, memory-mapping files; JSON columns are kept as raw strings
+            df = pd.read_csv(
+                stream,
+                dtype=str,
+                keep_default_na=False,
+                encoding='utf-8',
+                memory_map=isinstance(stream, str)
+            ).reindex(columns=self.FIELDNAMES, fill_value='')
+            
+            ids = df['id'].astype('int64').tolist()
+            usernames = df['username'].tolist()
+            
+            # Rows with unparseable JSON are reported after the loop
+            invalid_preferences = []
+            invalid_history = []
+            
+            for user_id, username, raw_preferences, raw_history in zip(
+                ids, usernames, df['preferences'].tolist(), df['history'].tolist()
+            ):
+                # Parse preferences and history if present
+                preferences = {}
+                if raw_preferences:
+                    try:
+                        preferences = orjson.loads(raw_preferences)
+                    except orjson.JSONDecodeError:
+                        invalid_preferences.append(user_id)
+                
+                history = []
+                if raw_history:
+                    try:
+                        history = orjson.loads(raw_history)
+                        if not all(type(x) is int for x in history):
+                            history = [int(x) for x in history]
+                    except (orjson.JSONDecodeError, ValueError):
+                        history = []
+                        invalid_history.append(user_id)
+                
+                # Create user object
+                user = User._unchecked(
+                    username=username,
+                    id=user_id,
+                    preferences=preferences,
+                    history=history
+                )
+                self.users[user_id] = user
+            
+            for user_id in invalid_preferences:
+                self._logger.warning(f"Invalid preferences JSON for user {user_id}")
+            for user_id in invalid_history:
+                self._logger.warning(f"Invalid history JSON for user {user_id}")
+                
             self._logger.info(f"Loaded {len(self.users)} users")
         
         except Exception as e:
@@ -86,24 +135,119 @@ class UserRepository:
         try:
             self._logger.info(f"Saving users to {self.users_file}")
             
-            with open(self.users_file, 'w', newline='', encoding='utf-8') as csvfile:
-                fieldnames = ['id', 'username', 'preferences', 'history']
-                writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-                writer.writeheader()
-                
-                for user in self.users.values():
-                    writer.writerow({
-                        'id': user.id,
-                        'username': user.username,
-                        'preferences': json.dumps(user.preferences),
-                        'history': json.dumps(user.history)
-                    })
+            # Build the file in memory, write it in one call and swap it in,
+            # so a failed save never leaves a partial file behind
+            buffer = io.BytesIO()
+            self._dump_to_stream(buffer)
+            temp_file = f"{self.users_file}.tmp"
+            with open(temp_file, 'wb') as f:
+                f.write(buffer.getbuffer())
+            os.replace(temp_file, self.users_file)
             
+            # The CSV file now holds every change, so the journal is obsolete
+            if os.path.exists(self.journal_file):
+                os.remove(self.journal_file)
+            self._journal_ops = 0
             self._logger.info(f"Saved {len(self.users)} users")
         
         except Exception as e:
             self._logger.error(f"Error saving users: {e}")
     
+    def _dump_to_stream(self, stream: BinaryIO) -> None:
+        """
+        Write all users as CSV data.
+        
+        Args:
+            stream: Binary file-like object to write to; it is left open
+        """
+        # Build each column once and let pandas write the data in one call
+        users = list(self.users.values())
+        df = pd.DataFrame({
+            'id': [user.id for user in users],
+            'username': [user.username for user in users],
+            'preferences': [orjson.dumps(user.preferences).decode() for user in users],
+            'history': [orjson.dumps(user.history).decode() for user in users]
+        }, columns=self.FIELDNAMES)
+        df.to_csv(stream, index=False, encoding='utf-8')
+    
+    def compact(self) -> None:
+        """Fold the journal into the CSV file, if it has any entries."""
+        if self._journal_ops:
+            self.save_all()
+    
+    def _replay_journal(self) -> None:
+        """Apply the operations recorded in the journal on top of the loaded users."""
+        try:
+            self._logger.info(f"Replaying user journal {self.journal_file}")
+            
+            # An empty journal has nothing to replay and cannot be mapped
+            if os.path.getsize(self.journal_file) == 0:
+                return
+            
+            # Map the journal rather than copying it through a read buffer;
+            # orjson decodes each line's UTF-8 bytes directly
+            truncated_at = None
+            with open(self.journal_file, 'rb') as journal:
+                mapped = mmap.mmap(journal.fileno(), 0, access=mmap.ACCESS_READ)
+            with mapped:
+                while True:
+                    offset = mapped.tell()
+                    line = mapped.readline()
+                    if not line:
+                        break
+                    try:
+                        record = orjson.loads(line)
+                    except orjson.JSONDecodeError:
+                        # A write interrupted mid-line; nothing after it was acknowledged
+                        self._logger.warning("Dropping truncated user journal entry")
+                        truncated_at = offset
+                        break
+                    
+                    self._journal_ops += 1
+                    if record['op'] == 'put':
+                        data = record['user']
+                        self.users[data['id']] = User._unchecked(
+                            username=data['username'],
+                            id=data['id'],
+                            preferences=data['preferences'],
+                            history=[int(x) for x in data['history']]
+                        )
+                    elif record['op'] == 'del':
+                        self.users.pop(record['id'], None)
+            
+            # Cut the partial entry off, so later entries are not appended to it
+            if truncated_at is not None:
+                os.truncate(self.journal_file, truncated_at)
+            
+            self._logger.info(f"Replayed {self._journal_ops} journal entries")
+        
+        except Exception as e:
+            self._logger.error(f"Error replaying user journal: {e}")
+    
+    def _append_journal(self, record: Dict[str, Any]) -> None:
+        """
+        Record a single operation in the journal.
+        
+        Compacts instead when the journal would outgrow the number of users.
+        
+        Args:
+            record: Journal entry ('put' with a user, or 'del' with an ID)
+        """
+        if self._journal_ops + 1 > len(self.users):
+            self.save_all()
+            return
+        
+        # Unlike a full save, a lost journal entry would silently drop the
+        # change, so errors are raised to the caller
+        try:
+            with open(self.journal_file, 'ab') as journal:
+                journal.write(orjson.dumps(record, option=orjson.OPT_APPEND_NEWLINE))
+            self._journal_ops += 1
+        
+        except Exception as e:
+            self._logger.error(f"Error writing user journal: {e}")
+            raise
+    
     def get_all(self) -> List[User]:
         """
         Get all users.
@@ -141,12 +285,22 @@ class UserRepository:
         # Assign ID if not present
         if user.id is None:
             user.id = self._get_next_id()
+        elif self._next_id is not None and user.id >= self._next_id:
+            self._next_id = user.id + 1
         
         self._logger.debug(f"Saving user {user.username} with ID {user.id}")
         self.users[user.id] = user
         
-        # Save to file
-        self.save_all()
+        # Record in the journal
+        self._append_journal({
+            'op': 'put',
+            'user': {
+                'id': user.id,
+                'username': user.username,
+                'preferences': user.preferences,
+                'history': [int(item_id) for item_id in user.history]
+            }
+        })
         
         return user
     
@@ -163,7 +317,7 @@ class UserRepository:
         if user_id in self.users:
             self._logger.debug(f"Deleting user {user_id}")
             del self.users[user_id]
-            self.save_all()
+            self._append_journal({'op': 'del', 'id': user_id})
             return True
         else:
             self._logger.debug(f"User not found for deletion: {user_id}")
@@ -176,6 +330,9 @@ class UserRepository:
         Returns:
             Next available user ID
         """
-        if not self.users:
-            return 1
-        return max(self.users.keys()) + 1
+        if self._next_id is None:
+            self._next_id = max(self.users.keys(), default=0) + 1
+        
+        next_id = self._next_id
+        self._next_id += 1
+        return next_id
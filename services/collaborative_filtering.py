@@ -5,10 +5,55 @@
 Collaborative filtering recommendation algorithm implementation.
 """
 
+import hashlib
 import logging
+import os
 import numpy as np
-from typing import List, Dict, Any, Tuple, Set
-from utils import cosine_similarity, pearson_correlation
+import scipy.sparse as sp
+from collections.abc import Mapping
+from typing import Iterator, List, Dict, Any, Optional, Tuple, Set
+from utils import DENSE_DENSITY, cosine_similarity, pearson_correlation, top_predictions
+
+
+class SimilarityView(Mapping):
+    """
+    Read-only {id: {other_id: similarity}} view over a square CSR similarity matrix.
+    
+    Stores only the CSR arrays; the inner dictionary for an ID is built from
+    its row when accessed.
+    """
+    
+    __slots__ = ('_matrix', '_ids', '_index')
+    
+    def __init__(self, matrix: sp.csr_matrix, ids: np.ndarray, index: Dict[int, int]):
+        """
+        Initialize the view.
+        
+        Args:
+            matrix: Square CSR similarity matrix
+            ids: Entity ID per row/column
+            index: Row/column position of each entity ID
+        """
+        self._matrix = matrix
+        self._ids = ids
+        self._index = index
+    
+    def __getitem__(self, entity_id: int) -> Dict[int, float]:
+        row = self._index[entity_id]
+        start, end = self._matrix.indptr[row], self._matrix.indptr[row + 1]
+        return dict(zip(
+            self._ids[self._matrix.indices[start:end]].tolist(),
+            self._matrix.data[start:end].tolist()
+        ))
+    
+    def __contains__(self, entity_id: object) -> bool:
+        return entity_id in self._index
+    
+    def __iter__(self) -> Iterator[int]:
+        return iter(self._index)
+    
+    def __len__(self) -> int:
+        return len(self._index)
 
 
 class CollaborativeFiltering:
@@ -16,19 +61,42 @@ class CollaborativeFiltering:
     Collaborative filtering recommendation algorithm using user-based and item-based approaches.
     """
     
-    def __init__(self, method: str = 'user-based', similarity_metric: str = 'cosine'):
+    # Fraction of non-zero ratings above which similarities are computed
+    # with a dense BLAS matrix product instead of a sparse one
+    DENSE_DENSITY = DENSE_DENSITY
+    
+    # Rows per tile of the dense similarity product, sized so a pair of
+    # tiles and their product stay cache-resident; also the block size of
+    # the Pearson computation, bounding its dense temporaries
+    SIMILARITY_BLOCK = 512
+    
+    # Similarities at or below this value are dropped from the stored matrices
+    SIMILARITY_THRESHOLD = 0.1
+    
+    def __init__(
+        self,
+        method: str = 'user-based',
+        similarity_metric: str = 'cosine',
+        k_neighbors: int = 50,
+        cache_dir: Optional[str] = None
+    ):
         """
         Initialize the collaborative filtering algorithm.
         
         Args:
             method: Method to use ('user-based' or 'item-based')
             similarity_metric: Similarity metric ('cosine' or 'pearson')
+            k_neighbors: Number of most similar users to predict from (user-based)
+            cache_dir: Directory to cache computed similarity matrices in, keyed
+                by the ratings they were computed from (disabled if None)
         """
         self._logger = logging.getLogger(f"{__name__}.{self.__class__.__name__}")
         self._logger.info(f"Initializing {method} collaborative filtering with {similarity_metric} similarity")
         
         self.method = method
         self.similarity_metric = similarity_metric
+        self.k_neighbors = k_neighbors
+        self.cache_dir = cache_dir
         
         # Data storage
         self.user_item_ratings = {}  # {user_id: {item_id: rating}}
@@ -36,10 +104,21 @@ class CollaborativeFiltering:
         self.user_means = {}         # {user_id: mean_rating}
         self.item_means = {}         # {item_id: mean_rating}
         
-        # Similarity matrices
+        # Similarity matrices, as {id: {other_id: similarity}} views over CSR matrices
         self.user_similarity = {}    # {user_id: {other_user_id: similarity}}
         self.item_similarity = {}    # {item_id: {other_item_id: similarity}}
         
+        # Sparse user-item ratings matrix and the positions of users and items in it
+        self._ratings_matrix = None  # CSR matrix, one row per user
+        self._uidx = {}              # {user_id: row}
+        self._iidx = {}              # {item_id: column}
+        self._user_ids = np.zeros(0, dtype=np.int64)  # user ID per row
+        self._item_ids = np.zeros(0, dtype=np.int64)  # item ID per column
+        self._user_similarity_matrix = None  # CSR matrix, rows/columns follow _uidx
+        self._item_similarity_matrix = None  # CSR matrix, rows/columns follow _iidx
+        self._user_means_vec = np.zeros(0)  # mean rating per row
+        self._item_means_vec = np.zeros(0)  # mean rating per column
+        
         # Choose similarity function
         self.similarity_func = cosine_similarity if similarity_metric == 'cosine' else pearson_correlation
     
@@ -77,99 +156,260 @@ class CollaborativeFiltering:
                 self.item_user_ratings[item_id] = {}
             self.item_user_ratings[item_id][user_id] = value
         
-        # Calculate user means
-        for user_id, ratings in self.user_item_ratings.items():
-            if ratings:
-                self.user_means[user_id] = sum(ratings.values()) / len(ratings)
-            else:
-                self.user_means[user_id] = 0.0
+        self._ratings_matrix = self._build_sparse_matrix()
+        
+        # Calculate user and item means in one pass over the sparse matrix
+        user_counts = np.diff(self._ratings_matrix.indptr)
+        user_sums = np.asarray(self._ratings_matrix.sum(axis=1, dtype=np.float64)).ravel()
+        self._user_means_vec = user_sums / np.maximum(user_counts, 1)
+        
+        item_counts = np.bincount(self._ratings_matrix.indices, minlength=len(self._iidx))
+        item_sums = np.asarray(self._ratings_matrix.sum(axis=0, dtype=np.float64)).ravel()
+        self._item_means_vec = item_sums / np.maximum(item_counts, 1)
         
-        # Calculate item means
-        for item_id, ratings in self.item_user_ratings.items():
-            if ratings:
-                self.item_means[item_id] = sum(ratings.values()) / len(ratings)
-            else:
-                self.item_means[item_id] = 0.0
+        self.user_means = dict(zip(self._user_ids.tolist(), self._user_means_vec.tolist()))
+        self.item_means = dict(zip(self._item_ids.tolist(), self._item_means_vec.tolist()))
         
         # Calculate similarities based on chosen method
         if self.method == 'user-based':
-            self._compute_user_similarities()
+            self._compute_similarities('user')
         else:  # item-based
-            self._compute_item_similarities()
+            self._compute_similarities('item')
             
         self._logger.info("Collaborative filtering model training complete")
     
-    def _compute_user_similarities(self) -> None:
-        """Compute similarity between all users."""
-        self._logger.debug("Computing user similarities")
-        self.user_similarity = {}
-        
-        all_users = list(self.user_item_ratings.keys())
-        all_items = set()
-        for user_ratings in self.user_item_ratings.values():
-            all_items.update(user_ratings.keys())
-        all_items = list(all_items)
-        
-        # Create user vectors for all items
-        user_vectors = {}
-        for user_id in all_users:
-            vector = []
-            user_ratings = self.user_item_ratings.get(user_id, {})
-            for item_id in all_items:
-                vector.append(user_ratings.get(item_id, 0.0))
-            user_vectors[user_id] = np.array(vector)
-        
-        # Calculate similarities
-        for i, user1 in enumerate(all_users):
-            self.user_similarity[user1] = {}
-            vec1 = user_vectors[user1]
+    def _build_sparse_matrix(self) -> sp.csr_matrix:
+        """
+        Build the sparse user-item ratings matrix in one pass over the ratings.
+        
+        Rows follow self._uidx and columns follow self._iidx.
+        
+        Returns:
+            float32 CSR matrix of shape (n_users, n_items)
+        """
+        self._uidx = {user_id: row for row, user_id in enumerate(self.user_item_ratings)}
+        self._iidx = {item_id: col for col, item_id in enumerate(self.item_user_ratings)}
+        self._user_ids = np.fromiter(self._uidx, dtype=np.int64, count=len(self._uidx))
+        self._item_ids = np.fromiter(self._iidx, dtype=np.int64, count=len(self._iidx))
+        
+        indptr = np.zeros(len(self._uidx) + 1, dtype=np.int64)
+        indices = []
+        data = []
+        for row, user_ratings in enumerate(self.user_item_ratings.values()):
+            indices.extend(map(self._iidx.__getitem__, user_ratings))
+            data.extend(user_ratings.values())
+            indptr[row + 1] = len(indices)
+        
+        return sp.csr_matrix(
+            (np.array(data, dtype=np.float32), np.array(indices, dtype=np.int64), indptr),
+            shape=(len(self._uidx), len(self._iidx))
+        )
+    
+    def _cosine_similarity_matrix(self, matrix: sp.csr_matrix) -> sp.csr_matrix:
+        """
+        Compute cosine similarities between all rows of a sparse matrix at once.
+        
+        Args:
+            matrix: CSR matrix with one row per entity
             
-            for user2 in all_users:
-                if user1 == user2:
-                    continue
-                    
-                vec2 = user_vectors[user2]
-                similarity = self.similarity_func(vec1, vec2)
-                
-                # Only store significant similarities to save memory
-                if not np.isnan(similarity) and similarity > 0.1:
-                    self.user_similarity[user1][user2] = similarity
+        Returns:
+            Square CSR matrix keeping only off-diagonal similarities above SIMILARITY_THRESHOLD
+        """
+        # L2-normalize rows; all-zero rows stay zero
+        norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+        inv_norms = np.divide(1.0, norms, out=np.zeros_like(norms), where=norms > 0)
+        normalized = sp.diags(inv_norms) @ matrix
+        
+        # Dense enough that a multi-threaded GEMM beats sparse multiplication
+        n_rows, n_cols = matrix.shape
+        if n_rows and n_cols and matrix.nnz / (n_rows * n_cols) > self.DENSE_DENSITY:
+            return self._dense_similarity_matrix(normalized.toarray())
+        
+        similarity = (normalized @ normalized.T).tocoo()
+        
+        # Only store significant similarities to save memory
+        keep = (similarity.data > self.SIMILARITY_THRESHOLD) & (similarity.row != similarity.col)
+        return sp.csr_matrix(
+            (similarity.data[keep], (similarity.row[keep], similarity.col[keep])),
+            shape=similarity.shape
+        )
     
-    def _compute_item_similarities(self) -> None:
-        """Compute similarity between all items."""
-        self._logger.debug("Computing item similarities")
-        self.item_similarity = {}
-        
-        all_items = list(self.item_user_ratings.keys())
-        all_users = set()
-        for item_ratings in self.item_user_ratings.values():
-            all_users.update(item_ratings.keys())
-        all_users = list(all_users)
-        
-        # Create item vectors for all users
-        item_vectors = {}
-        for item_id in all_items:
-            vector = []
-            item_ratings = self.item_user_ratings.get(item_id, {})
-            for user_id in all_users:
-                vector.append(item_ratings.get(user_id, 0.0))
-            item_vectors[item_id] = np.array(vector)
-        
-        # Calculate similarities
-        for i, item1 in enumerate(all_items):
-            self.item_similarity[item1] = {}
-            vec1 = item_vectors[item1]
+    def _dense_similarity_matrix(self, normalized: np.ndarray) -> sp.csr_matrix:
+        """
+        Compute dot products between all rows of a dense matrix, tile by tile.
+        
+        Only the upper triangle of SIMILARITY_BLOCK x SIMILARITY_BLOCK tiles is
+        multiplied; the result is symmetric, so each tile is mirrored.
+        
+        Args:
+            normalized: Dense matrix with L2-normalized rows
             
-            for item2 in all_items:
-                if item1 == item2:
-                    continue
-                    
-                vec2 = item_vectors[item2]
-                similarity = self.similarity_func(vec1, vec2)
+        Returns:
+            Square CSR matrix keeping only off-diagonal similarities above SIMILARITY_THRESHOLD
+        """
+        n_rows = normalized.shape[0]
+        block = self.SIMILARITY_BLOCK
+        rows, cols, values = [], [], []
+        
+        for i in range(0, n_rows, block):
+            tile_rows = normalized[i:i + block]
+            for j in range(i, n_rows, block):
+                tile = tile_rows @ normalized[j:j + block].T
                 
                 # Only store significant similarities to save memory
-                if not np.isnan(similarity) and similarity > 0.1:
-                    self.item_similarity[item1][item2] = similarity
+                tile_row, tile_col = np.nonzero(tile > self.SIMILARITY_THRESHOLD)
+                tile_values = tile[tile_row, tile_col]
+                tile_row += i
+                tile_col += j
+                
+                if i == j:
+                    keep = tile_row != tile_col
+                    rows.append(tile_row[keep])
+                    cols.append(tile_col[keep])
+                    values.append(tile_values[keep])
+                else:
+                    rows.extend((tile_row, tile_col))
+                    cols.extend((tile_col, tile_row))
+                    values.extend((tile_values, tile_values))
+        
+        return sp.csr_matrix(
+            (np.concatenate(values), (np.concatenate(rows), np.concatenate(cols))),
+            shape=(n_rows, n_rows)
+        )
+    
+    def _pearson_similarity_matrix(self, matrix: sp.csr_matrix) -> sp.csr_matrix:
+        """
+        Compute Pearson correlations between all rows of a sparse matrix.
+        
+        Each pair is correlated over the columns both rows have values for,
+        like utils.pearson_correlation. Every co-rated sum is obtained from
+        sparse matrix products, one block of SIMILARITY_BLOCK rows at a time,
+        and each block is sparsified before the next one is computed.
+        
+        Args:
+            matrix: CSR matrix with one row per entity
+            
+        Returns:
+            Square CSR matrix keeping only off-diagonal correlations above SIMILARITY_THRESHOLD
+        """
+        # Zero ratings count as missing, as in utils.pearson_correlation
+        values = matrix.astype(np.float64)
+        values.eliminate_zeros()
+        rated = values.copy()
+        rated.data[:] = 1.0
+        squares = values.multiply(values).tocsr()
+        
+        n_rows = matrix.shape[0]
+        block = self.SIMILARITY_BLOCK
+        rows, cols, data = [], [], []
+        
+        for i in range(0, n_rows, block):
+            rated_block = rated[i:i + block]
+            
+            # Pairwise sums over co-rated columns; sum_x[r, j] sums row i + r over
+            # the columns it shares with row j, sum_y sums row j over the same
+            co_rated = (rated_block @ rated.T).toarray()
+            sum_x = (values[i:i + block] @ rated.T).toarray()
+            sum_xx = (squares[i:i + block] @ rated.T).toarray()
+            sum_y = (rated_block @ values.T).toarray()
+            sum_yy = (rated_block @ squares.T).toarray()
+            sum_xy = (values[i:i + block] @ values.T).toarray()
+            
+            with np.errstate(divide='ignore', invalid='ignore'):
+                covariance = sum_xy - sum_x * sum_y / co_rated
+                variance_x = sum_xx - sum_x ** 2 / co_rated
+                variance_y = sum_yy - sum_y ** 2 / co_rated
+                correlation = covariance / np.sqrt(variance_x * variance_y)
+            
+            # Pairs with fewer than two co-rated columns or a constant side are undefined
+            valid = (co_rated >= 2) & (variance_x > 1e-9) & (variance_y > 1e-9)
+            
+            # Only store significant similarities to save memory
+            block_row, block_col = np.nonzero(valid & (correlation > self.SIMILARITY_THRESHOLD))
+            keep = block_row + i != block_col
+            rows.append(block_row[keep] + i)
+            cols.append(block_col[keep])
+            data.append(correlation[block_row[keep], block_col[keep]])
+        
+        if not rows:
+            return sp.csr_matrix((n_rows, n_rows))
+        return sp.csr_matrix(
+            (np.concatenate(data), (np.concatenate(rows), np.concatenate(cols))),
+            shape=(n_rows, n_rows)
+        )
+    
+    def _similarity_matrix(self, matrix: sp.csr_matrix, kind: str) -> sp.csr_matrix:
+        """
+        Compute the similarity matrix between rows using the configured metric.
+        
+        When a cache directory is set, the result is stored there as .npz under
+        a hash of the matrix and reused whenever the same ratings are trained on.
+        Only the latest entry per kind and metric is kept.
+        
+        Args:
+            matrix: CSR matrix with one row per entity
+            kind: Entity kind ('user' or 'item'), used in the cache file name
+            
+        Returns:
+            Square CSR similarity matrix
+        """
+        compute = (
+            self._cosine_similarity_matrix if self.similarity_metric == 'cosine'
+            else self._pearson_similarity_matrix
+        )
+        if self.cache_dir is None:
+            return compute(matrix)
+        
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(f"{self.similarity_metric}:{self.SIMILARITY_THRESHOLD}:{matrix.shape}".encode())
+        for array in (matrix.data, matrix.indices, matrix.indptr):
+            digest.update(array.tobytes())
+        prefix = f"{kind}_{self.similarity_metric}_similarity_"
+        cache_name = f"{prefix}{digest.hexdigest()}.npz"
+        cache_file = os.path.join(self.cache_dir, cache_name)
+        
+        if os.path.exists(cache_file):
+            try:
+                self._logger.debug(f"Loading {kind} similarities from {cache_file}")
+                return sp.load_npz(cache_file).tocsr()
+            except Exception as e:
+                self._logger.warning(f"Error loading cached similarities: {e}")
+        
+        similarity = compute(matrix)
+        try:
+            # Write to a temporary file and swap it in, so a crash never
+            # leaves a partial cache file behind
+            os.makedirs(self.cache_dir, exist_ok=True)
+            temp_file = f"{cache_file}.tmp"
+            with open(temp_file, 'wb') as f:
+                sp.save_npz(f, similarity)
+            os.replace(temp_file, cache_file)
+            
+            # Matrices computed from earlier ratings are never loaded again
+            for name in os.listdir(self.cache_dir):
+                if name.startswith(prefix) and name.endswith('.npz') and name != cache_name:
+                    os.remove(os.path.join(self.cache_dir, name))
+        except Exception as e:
+            self._logger.warning(f"Error caching similarities: {e}")
+        return similarity
+    
+    def _compute_similarities(self, kind: str) -> None:
+        """
+        Compute similarity between all users or between all items.
+        
+        Items are handled as the rows of the transposed ratings matrix, so
+        both kinds share one code path.
+        
+        Args:
+            kind: Entity kind to compare ('user' or 'item')
+        """
+        self._logger.debug(f"Computing {kind} similarities")
+        if kind == 'user':
+            self._user_similarity_matrix = self._similarity_matrix(self._ratings_matrix, kind)
+            self.user_similarity = SimilarityView(self._user_similarity_matrix, self._user_ids, self._uidx)
+        else:
+            self._item_similarity_matrix = self._similarity_matrix(self._ratings_matrix.T.tocsr(), kind)
+            self.item_similarity = SimilarityView(self._item_similarity_matrix, self._item_ids, self._iidx)
     
     def recommend_for_user(self, user_id: int, limit: int = 10) -> List[Tuple[int, float]]:
         """
@@ -197,51 +437,44 @@ class CollaborativeFiltering:
             self._logger.warning(f"No ratings found for user {user_id}")
             return []
         
-        # User's rated items
-        rated_items = set(user_ratings.keys())
-        
-        # Get similar users
-        similar_users = self.user_similarity.get(user_id, {})
-        if not similar_users:
+        # Similar users are the stored entries of the user's similarity row
+        row = self._uidx[user_id]
+        start, end = self._user_similarity_matrix.indptr[row], self._user_similarity_matrix.indptr[row + 1]
+        if start == end:
             self._logger.warning(f"No similar users found for user {user_id}")
             return []
+        neighbor_rows = self._user_similarity_matrix.indices[start:end]
+        similarities = self._user_similarity_matrix.data[start:end].astype(np.float64)
         
-        # Generate predictions for unrated items
-        predictions = {}
-        user_mean = self.user_means.get(user_id, 0.0)
+        user_mean = self._user_means_vec[row]
         
-        for other_user_id, similarity in sorted(similar_users.items(), key=lambda x: x[1], reverse=True):
-            other_user_ratings = self.user_item_ratings.get(other_user_id, {})
-            other_user_mean = self.user_means.get(other_user_id, 0.0)
-            
-            for item_id, rating in other_user_ratings.items():
-                if item_id in rated_items:
-                    continue  # Skip items the user has already rated
-                
-                if item_id not in predictions:
-                    predictions[item_id] = {'weighted_sum': 0.0, 'similarity_sum': 0.0}
-                
-                # Normalize rating by user's mean
-                adjusted_rating = rating - other_user_mean
-                
-                # Update prediction
-                predictions[item_id]['weighted_sum'] += similarity * adjusted_rating
-                predictions[item_id]['similarity_sum'] += abs(similarity)
-        
-        # Calculate final predictions
-        final_predictions = []
-        for item_id, data in predictions.items():
-            if data['similarity_sum'] > 0:
-                # Denormalize prediction using the target user's mean
-                prediction = user_mean + (data['weighted_sum'] / data['similarity_sum'])
-                
-                # Clamp to valid rating range
-                prediction = max(0.5, min(5.0, prediction))
-                final_predictions.append((item_id, prediction))
+        # Only the k most similar users contribute
+        if len(similarities) > self.k_neighbors:
+            top_k = np.argpartition(similarities, -self.k_neighbors)[-self.k_neighbors:]
+            neighbor_rows = neighbor_rows[top_k]
+            similarities = similarities[top_k]
+        neighbor_means = self._user_means_vec[neighbor_rows]
+        
+        # Neighbors' ratings (k x I) and which of them are present
+        neighbor_ratings = self._ratings_matrix[neighbor_rows]
+        rated_mask = neighbor_ratings.copy()
+        rated_mask.data[:] = 1.0
+        
+        # Sum of similarity * (rating - neighbor mean) and of |similarity| per item,
+        # counting only the neighbors who rated the item
+        weighted_sum = neighbor_ratings.T @ similarities - rated_mask.T @ (similarities * neighbor_means)
+        similarity_sum = rated_mask.T @ np.abs(similarities)
         
-        # Sort and return top recommendations
-        final_predictions.sort(key=lambda x: x[1], reverse=True)
-        return final_predictions[:limit]
+        # Predict items some neighbor rated, skipping items the user has already rated
+        candidates = similarity_sum > 0
+        start, end = self._ratings_matrix.indptr[row], self._ratings_matrix.indptr[row + 1]
+        candidates[self._ratings_matrix.indices[start:end]] = False
+        candidate_cols = np.flatnonzero(candidates)
+        
+        # Denormalize predictions using the target user's mean and clamp to the valid rating range
+        scores = np.clip(user_mean + weighted_sum[candidate_cols] / similarity_sum[candidate_cols], 0.5, 5.0)
+        
+        return top_predictions(self._item_ids[candidate_cols], scores, limit)
     
     def _item_based_recommendations(self, user_id: int, limit: int = 10) -> List[Tuple[int, float]]:
         """Generate item-based recommendations."""
@@ -251,36 +484,26 @@ class CollaborativeFiltering:
             self._logger.warning(f"No ratings found for user {user_id}")
             return []
         
-        # User's rated items
-        rated_items = set(user_ratings.keys())
-        all_items = set(self.item_user_ratings.keys())
+        # The user's ratings as a dense vector over items, and which items they rated
+        row = self._uidx[user_id]
+        start, end = self._ratings_matrix.indptr[row], self._ratings_matrix.indptr[row + 1]
+        rated_cols = self._ratings_matrix.indices[start:end]
+        user_vector = np.zeros(len(self._iidx))
+        user_vector[rated_cols] = self._ratings_matrix.data[start:end]
+        rated = np.zeros(len(self._iidx))
+        rated[rated_cols] = 1.0
         
-        # Items to predict
-        predict_items = all_items - rated_items
+        # Similarity-weighted sum of the user's ratings, and sum of |similarity|
+        # over the rated items, for every item at once
+        weighted_sum = self._item_similarity_matrix @ user_vector
+        similarity_sum = abs(self._item_similarity_matrix) @ rated
         
-        # Generate predictions
-        predictions = []
+        # Predict unrated items similar to at least one rated item
+        candidates = similarity_sum > 0
+        candidates[rated_cols] = False
+        candidate_cols = np.flatnonzero(candidates)
         
-        for item_id in predict_items:
-            similar_items = self.item_similarity.get(item_id, {})
-            if not similar_items:
-                continue
-                
-            weighted_sum = 0.0
-            similarity_sum = 0.0
-            
-            for rated_item, similarity in similar_items.items():
-                if rated_item in user_ratings:
-                    rating = user_ratings[rated_item]
-                    weighted_sum += similarity * rating
-                    similarity_sum += abs(similarity)
-            
-            if similarity_sum > 0:
-                prediction = weighted_sum / similarity_sum
-                # Clamp to valid rating range
-                prediction = max(0.5, min(5.0, prediction))
-                predictions.append((item_id, prediction))
-        
-        # Sort and return top recommendations
-        predictions.sort(key=lambda x: x[1], reverse=True)
-        return predictions[:limit]
+        # Clamp to valid rating range
+        scores = np.clip(weighted_sum[candidate_cols] / similarity_sum[candidate_cols], 0.5, 5.0)
+        
+        return top_predictions(self._item_ids[candidate_cols], scores, limit)
@@ -6,10 +6,61 @@ Content-based recommendation algorithm implementation.
 """
 
 import logging
+import math
 import numpy as np
-from typing import List, Dict, Any, Tuple, Optional, Set
-from collections import defaultdict
-from utils import cosine_similarity
+import scipy.sparse as sp
+from collections.abc import Mapping
+from itertools import chain
+from typing import Iterator, List, Dict, Any, Tuple, Optional, Set
+from utils import DENSE_DENSITY, top_predictions
+
+
+class ProfileView(Mapping):
+    """
+    Read-only {user_id: {feature: weight}} view over the dense user profile matrix.
+    
+    Stores only the matrix; the dictionary for a user is built from the
+    non-zero entries of their row when accessed.
+    """
+    
+    __slots__ = ('_matrix', '_features', '_index', '_extra')
+    
+    def __init__(
+        self,
+        matrix: np.ndarray,
+        features: List[str],
+        index: Dict[int, int],
+        extra: Dict[int, Dict[str, float]]
+    ):
+        """
+        Initialize the view.
+        
+        Args:
+            matrix: Profile matrix with one row per user
+            features: Feature name per column
+            index: Row position of each user ID
+            extra: Per-user weights of features outside the matrix columns
+        """
+        self._matrix = matrix
+        self._features = features
+        self._index = index
+        self._extra = extra
+    
+    def __getitem__(self, user_id: int) -> Dict[str, float]:
+        row = self._matrix[self._index[user_id]]
+        cols = np.flatnonzero(row)
+        profile = dict(zip([self._features[col] for col in cols.tolist()], row[cols].tolist()))
+        profile.update(self._extra.get(user_id, {}))
+        return profile
+    
+    def __contains__(self, user_id: object) -> bool:
+        return user_id in self._index
+    
+    def __iter__(self) -> Iterator[int]:
+        return iter(self._index)
+    
+    def __len__(self) -> int:
+        return len(self._index)
 
 
 class ContentBased:
@@ -17,29 +68,51 @@ class ContentBased:
     Content-based recommendation algorithm using item features and user preferences.
     """
     
+    # Fraction of non-zero item features at or below which the normalized
+    # item matrix is kept in CSR form for scoring
+    DENSE_DENSITY = DENSE_DENSITY
+    
     def __init__(self):
         """Initialize the content-based filtering algorithm."""
         self._logger = logging.getLogger(f"{__name__}.{self.__class__.__name__}")
         self._logger.info("Initializing content-based filtering")
         
         # Data storage
-        self.user_profiles = {}      # {user_id: {feature: weight}}
+        self.user_profiles = {}      # {user_id: {feature: weight}}, a ProfileView once trained
         self.item_features = {}      # {item_id: {feature: value}}
         self.feature_list = []       # List of all features
+        self._feature_index = {}     # {feature: position in feature_list}
+        self._is_category = np.empty(0, dtype=bool)  # Category flag per feature_list entry
         self.user_item_ratings = {}  # {user_id: {item_id: rating}}
+        
+        # Dense float32 item-feature matrix and its L2-normalized copy (dense,
+        # or CSR for sparse catalogs); rows follow _item_ids, columns follow feature_list
+        self._item_ids = np.empty(0, dtype=np.int64)
+        self._item_matrix = np.empty((0, 0), dtype=np.float32)
+        self._item_matrix_normed: Any = np.empty((0, 0), dtype=np.float32)
+        
+        # Dense user profile matrix backing user_profiles; rows follow
+        # _profile_rows, columns follow feature_list
+        self._profile_rows: Dict[int, int] = {}
+        self._user_profile_matrix = np.empty((0, 0))
+        self._has_profile = np.empty(0, dtype=bool)  # Per profile row: any feature or preference
+        self._rated_rows = sp.csr_matrix((0, 0), dtype=bool)
     
     def train(self, data: Dict[str, Any]) -> None:
         """
         Train the algorithm with item and user data.
         
         Args:
-            data: Dictionary with 'items', 'users', and 'ratings'
+            data: Dictionary with 'items', 'users', and 'ratings'. Ratings may
+                be Rating objects or, to skip per-object access, a structured
+                array with 'user_id', 'item_id' and 'value' fields
         """
         self._logger.info("Training content-based model")
         
         # Extract data
         items = data.get('items', [])
         self.users = data.get('users', [])  # Store users for preference lookup
+        self._users_by_id = {user.id: user for user in self.users}
         self._logger.debug(f"Processing {len(items)} items")
         self._logger.debug(f"Loaded {len(self.users)} users")
         
@@ -48,111 +121,191 @@ class ContentBased:
         self.item_features = {}
         self.user_item_ratings = {}
         self.feature_list = []
+        self._feature_index = {}
+        self._is_category = np.empty(0, dtype=bool)
         
-        # Process items to extract features
-        items = data.get('items', [])
-        self._logger.debug(f"Processing {len(items)} items")
-        
-        # Collect all possible features
-        feature_set = set()
-        category_set = set()
+        # Process items in one pass: collect their features, number each feature
+        # in order of first appearance (the numbering doubles as the feature
+        # index) and record the matrix columns of each item
+        feature_order: Dict[str, int] = {}
+        item_columns: Dict[int, Tuple[List[int], List[float]]] = {}
         
         for item in items:
-            # Get direct features
-            for feature_name in item.features.keys():
-                feature_set.add(feature_name)
-            
-            # Convert categories to features
+            # Direct features plus binary category features
+            features = dict(item.features)
             for category in item.categories:
-                category_feature = f"category_{category}"
-                category_set.add(category_feature)
-        
-        # Combine feature lists
-        self.feature_list = sorted(list(feature_set)) + sorted(list(category_set))
-        self._logger.debug(f"Collected {len(self.feature_list)} unique features")
-        
-        # Build item feature vectors
-        for item in items:
-            item_id = item.id
-            self.item_features[item_id] = {}
+                features[f"category_{category}"] = 1.0
             
-            # Add direct features
-            for feature_name, value in item.features.items():
-                self.item_features[item_id][feature_name] = value
-            
-            # Add category features (binary)
-            for category in item.categories:
-                category_feature = f"category_{category}"
-                self.item_features[item_id][category_feature] = 1.0
+            self.item_features[item.id] = features
+            item_columns[item.id] = (
+                [feature_order.setdefault(feature, len(feature_order)) for feature in features],
+                list(features.values())
+            )
+        
+        self.feature_list = list(feature_order)
+        self._feature_index = feature_order
+        self._is_category = np.array(["category_" in feature for feature in self.feature_list], dtype=bool)
+        self._logger.debug(f"Collected {len(self.feature_list)} unique features")
         
-        # Process ratings
+        # Stack the item vectors once so recommendations are a single matrix product
+        counts = [len(cols) for cols, _ in item_columns.values()]
+        rows = np.repeat(np.arange(len(item_columns)), counts)
+        cols = np.fromiter(
+            chain.from_iterable(cols for cols, _ in item_columns.values()), dtype=np.int64, count=len(rows)
+        )
+        values = np.fromiter(
+            chain.from_iterable(values for _, values in item_columns.values()), dtype=np.float32, count=len(rows)
+        )
+        self._item_ids = np.fromiter(item_columns, dtype=np.int64, count=len(item_columns))
+        self._item_matrix = np.zeros((len(item_columns), len(self.feature_list)), dtype=np.float32)
+        self._item_matrix[rows, cols] = values
+        
+        # Normalize once so cosine similarity is a plain dot product; all-zero rows stay zero
+        norms = np.sqrt(np.einsum('ij,ij->i', self._item_matrix, self._item_matrix))[:, None]
+        norms[norms == 0] = 1.0
+        self._item_matrix_normed = self._item_matrix / norms
+        
+        # Large catalogs with many categories are mostly zeros; scoring then
+        # only needs to touch the non-zero features
+        if self._item_matrix.size and len(values) / self._item_matrix.size <= self.DENSE_DENSITY:
+            self._item_matrix_normed = sp.csr_matrix(self._item_matrix_normed)
+        
+        # Process ratings into parallel (struct-of-arrays) columns
         ratings = data.get('ratings', [])
         self._logger.debug(f"Processing {len(ratings)} ratings")
         
-        for rating in ratings:
-            user_id = rating.user_id
-            item_id = rating.item_id
-            value = float(rating.value)
-            
-            # Add to user-item ratings
-            if user_id not in self.user_item_ratings:
-                self.user_item_ratings[user_id] = {}
-            self.user_item_ratings[user_id][item_id] = value
+        if isinstance(ratings, np.ndarray):
+            # Already columnar; only cast where the dtypes differ
+            rating_user_ids = ratings['user_id'].astype(np.int64, copy=False)
+            rating_item_ids = ratings['item_id'].astype(np.int64, copy=False)
+            rating_values = ratings['value'].astype(np.float64, copy=False)
+        else:
+            rating_user_ids = np.fromiter((r.user_id for r in ratings), dtype=np.int64, count=len(ratings))
+            rating_item_ids = np.fromiter((r.item_id for r in ratings), dtype=np.int64, count=len(ratings))
+            rating_values = np.fromiter((r.value for r in ratings), dtype=np.float64, count=len(ratings))
+        
+        # Dense user/item positions; a later rating of the same item by the same user wins
+        user_ids, user_rows = np.unique(rating_user_ids, return_inverse=True)
+        rated_item_ids, item_positions = np.unique(rating_item_ids, return_inverse=True)
+        pair_keys = user_rows * len(rated_item_ids) + item_positions
+        _, last = np.unique(pair_keys[::-1], return_index=True)
+        keep = np.sort(len(ratings) - 1 - last)
+        
+        # Add to user-item ratings
+        for user_id, item_id, value in zip(
+            rating_user_ids[keep].tolist(),
+            rating_item_ids[keep].tolist(),
+            rating_values[keep].tolist()
+        ):
+            self.user_item_ratings.setdefault(user_id, {})[item_id] = value
         
         # Build user profiles based on their ratings
-        self._build_user_profiles()
+        self._build_user_profiles(user_ids, user_rows[keep], rating_item_ids[keep], rating_values[keep])
         
         self._logger.info("Content-based model training complete")
     
-    def _build_user_profiles(self) -> None:
+    def _build_user_profiles(
+        self,
+        user_ids: np.ndarray,
+        user_rows: np.ndarray,
+        item_ids: np.ndarray,
+        values: np.ndarray
+    ) -> None:
         """
         Build user profiles based on their ratings and item features.
         User profiles are weighted feature vectors representing user preferences.
+        
+        All profiles are computed at once as a sparse (users x items) weight
+        matrix times the item-feature matrix.
+        
+        Args:
+            user_ids: IDs of the users to build profiles for, one per profile row
+            user_rows: Profile row of each rating
+            item_ids: Item ID of each rating
+            values: Value of each rating
         """
         self._logger.debug("Building user profiles")
         
-        # Iterate through users
-        for user_id, ratings in self.user_item_ratings.items():
-            if not ratings:
-                continue
-                
-            # Initialize user profile
-            self.user_profiles[user_id] = defaultdict(float)
-            
-            # Get user explicit preferences if available from training data
-            user_obj = next((u for u in self.users if u.id == user_id), None)
+        user_ids = user_ids.tolist()
+        
+        # Normalize ratings to weights (0-1 scale where 5 stars → 1.0) in one pass,
+        # skipping negatively rated items
+        weights = (values - 1) / 4.0  # assuming 1-5 scale
+        positive = weights > 0
+        
+        # Total weights also count items without features
+        total_rating_weights = np.bincount(
+            user_rows[positive], weights=weights[positive], minlength=len(user_ids)
+        )
+        
+        # Locate the rated items in the item matrix
+        order = np.argsort(self._item_ids)
+        cols = np.zeros(len(item_ids), dtype=np.int64)
+        known = np.zeros(len(item_ids), dtype=bool)
+        if len(order):
+            positions = np.minimum(np.searchsorted(self._item_ids, item_ids, sorter=order), len(order) - 1)
+            cols = order[positions]
+            known = self._item_ids[cols] == item_ids
+        
+        # Item matrix rows each user has rated, for masking them out of recommendations
+        self._rated_rows = sp.csr_matrix(
+            (np.ones(np.count_nonzero(known), dtype=bool), (user_rows[known], cols[known])),
+            shape=(len(user_ids), len(self._item_ids))
+        )
+        
+        keep = positive & known
+        rows, cols, weights = user_rows[keep], cols[keep], weights[keep]
+        
+        # A user has a profile once a positively rated item has any features, even
+        # all-zero ones, or the user has preferences; a zero profile vector then
+        # scores every item at the minimum instead of giving no recommendations
+        item_has_features = np.fromiter(
+            (bool(self.item_features[item_id]) for item_id in self._item_ids.tolist()),
+            dtype=bool, count=len(self._item_ids)
+        )
+        has_profile = np.zeros(len(user_ids), dtype=bool)
+        has_profile[rows[item_has_features[cols]]] = True
+        
+        # Aggregate features from rated items, weighted by ratings; the float64
+        # weights keep the profiles in double precision
+        weight_matrix = sp.csr_matrix(
+            (weights, (rows, cols)),
+            shape=(len(user_ids), len(self._item_ids))
+        )
+        profiles = np.asarray(weight_matrix @ self._item_matrix).reshape(len(user_ids), len(self.feature_list))
+        
+        # Add explicit preferences from the training data into the category columns;
+        # categories no item has are kept aside for the profile dictionaries
+        extra_preferences: Dict[int, Dict[str, float]] = {}
+        for row, user_id in enumerate(user_ids):
+            user_obj = self._users_by_id.get(user_id)
             if user_obj and hasattr(user_obj, 'preferences') and user_obj.preferences:
                 self._logger.debug(f"Adding explicit preferences for user {user_id}: {user_obj.preferences}")
+                has_profile[row] = True
                 for category, weight in user_obj.preferences.items():
-                    # Add category preference to user profile with category_ prefix
                     category_feature = f"category_{category}"
-                    self.user_profiles[user_id][category_feature] = weight
-            
-            # Calculate total weight for normalization
-            total_rating_weight = 0.0
-            
-            # Aggregate features from rated items, weighted by ratings
-            for item_id, rating in ratings.items():
-                # Normalize rating to weight (0-1 scale where 5 stars → 1.0)
-                normalized_weight = (rating - 1) / 4.0  # assuming 1-5 scale
-                
-                # Skip negatively rated items
-                if normalized_weight <= 0:
-                    continue
-                    
-                total_rating_weight += normalized_weight
-                
-                # Get item features
-                item_features = self.item_features.get(item_id, {})
-                
-                # Add features to user profile with weights
-                for feature, value in item_features.items():
-                    self.user_profiles[user_id][feature] += value * normalized_weight
-            
-            # Normalize user profile if we have ratings
-            if total_rating_weight > 0:
-                for feature in self.user_profiles[user_id]:
-                    self.user_profiles[user_id][feature] /= total_rating_weight
+                    col = self._feature_index.get(category_feature)
+                    if col is not None:
+                        profiles[row, col] += weight
+                    else:
+                        extra_preferences.setdefault(row, {})[category_feature] = weight
+        
+        # Normalize user profiles that have positive ratings
+        rated = total_rating_weights > 0
+        profiles[rated] /= total_rating_weights[rated, None]
+        extra_by_user = {
+            user_ids[row]: {
+                feature: weight / total_rating_weights[row] if rated[row] else weight
+                for feature, weight in preferences.items()
+            }
+            for row, preferences in extra_preferences.items()
+        }
+        
+        # Profile dictionaries are only built for the users that are looked up
+        self._profile_rows = {user_id: row for row, user_id in enumerate(user_ids)}
+        self._user_profile_matrix = profiles
+        self._has_profile = has_profile
+        self.user_profiles = ProfileView(profiles, self.feature_list, self._profile_rows, extra_by_user)
         
         self._logger.debug(f"Built profiles for {len(self.user_profiles)} users")
     
@@ -170,40 +323,32 @@ class ContentBased:
         self._logger.info(f"Generating content-based recommendations for user {user_id}")
         
         # Get user profile
-        user_profile = self.user_profiles.get(user_id, {})
-        if not user_profile:
+        row = self._profile_rows.get(user_id)
+        if row is None or not self._has_profile[row]:
             self._logger.warning(f"No profile found for user {user_id}")
             return []
         
-        # Get user's already rated items
-        user_rated_items = set(self.user_item_ratings.get(user_id, {}).keys())
+        # User profile as a vector over feature_list
+        user_vector = self._user_profile_matrix[row].astype(np.float32)
         
-        # Convert user profile to vector
-        user_vector = np.array([user_profile.get(feature, 0.0) for feature in self.feature_list])
+        # Cosine similarity with every item in one matrix-vector product over the
+        # normalized rows; zero vectors have similarity 0, as in utils.cosine_similarity
+        user_norm = math.sqrt(np.vdot(user_vector, user_vector))
+        if user_norm > 0:
+            similarities = self._item_matrix_normed @ (user_vector / user_norm)
+        else:
+            similarities = np.zeros(len(self._item_ids), dtype=np.float32)
         
-        # Calculate similarity with all items
-        similarities = []
+        # Convert similarity to predicted rating (scale from similarity 0-1 to rating 1-5)
+        predicted_ratings = 1.0 + 4.0 * similarities
         
-        for item_id, features in self.item_features.items():
-            # Skip already rated items
-            if item_id in user_rated_items:
-                continue
-            
-            # Convert item features to vector
-            item_vector = np.array([features.get(feature, 0.0) for feature in self.feature_list])
-            
-            # Calculate similarity
-            similarity = cosine_similarity(user_vector, item_vector)
-            
-            # Convert similarity to predicted rating (scale from similarity 0-1 to rating 1-5)
-            predicted_rating = 1.0 + (4.0 * similarity)
-            
-            similarities.append((item_id, predicted_rating))
-        
-        # Sort by predicted rating
-        similarities.sort(key=lambda x: x[1], reverse=True)
+        # Skip already rated items, read from the user's row of the rated matrix
+        candidates = np.ones(len(self._item_ids), dtype=bool)
+        candidates[self._rated_rows.indices[self._rated_rows.indptr[row]:self._rated_rows.indptr[row + 1]]] = False
+        item_ids = self._item_ids[candidates]
+        predicted_ratings = predicted_ratings[candidates]
         
-        return similarities[:limit]
+        return top_predictions(item_ids, predicted_ratings, limit)
     
     def explain_recommendation(self, user_id: int, item_id: int, top_features: int = 3) -> Dict[str, Any]:
         """
@@ -228,72 +373,44 @@ class ContentBased:
         self._logger.debug(f"User profile: {user_profile}")
         self._logger.debug(f"Item features: {item_features}")
         
-        # Ensure at least one category feature is included (specifically for sci-fi)
-        # First, find category features in the item
-        item_categories = []
-        for feature in item_features:
-            if feature.startswith("category_"):
-                item_categories.append(feature)
-        
-        self._logger.debug(f"Item categories: {item_categories}")
-        
-        # Find category features in the user profile
-        user_categories = []
-        for feature in user_profile:
-            if feature.startswith("category_"):
-                user_categories.append(feature)
-                
-        self._logger.debug(f"User categories: {user_categories}")
-        
-        # Find common category features
-        common_categories = set(user_categories) & set(item_categories)
-        self._logger.debug(f"Common categories: {common_categories}")
-        
-        # Calculate feature contributions for all features
-        feature_contributions = {}
-        
-        # First add all common features
-        common_features = set(user_profile.keys()) & set(item_features.keys())
-        for feature in common_features:
-            user_value = user_profile.get(feature, 0.0)
-            item_value = item_features.get(feature, 0.0)
-            
-            if user_value > 0 and item_value > 0:
-                contribution = user_value * item_value
-                feature_contributions[feature] = contribution
-                
+        # Calculate feature contributions for all features at once;
+        # only features both sides have positively count
+        user_vector = self._feature_vector(user_profile)
+        item_vector = self._feature_vector(item_features)
+        contributions = user_vector * item_vector
+        selected = (user_vector > 0) & (item_vector > 0)
+        
         # Always include the sci-fi category if it exists in both user and item
-        sci_fi_feature = "category_sci-fi"
-        if sci_fi_feature in user_profile and sci_fi_feature in item_features:
-            user_value = user_profile.get(sci_fi_feature, 0.0)
-            item_value = item_features.get(sci_fi_feature, 0.0)
-            contribution = user_value * item_value
+        sci_fi_col = self._feature_index.get("category_sci-fi")
+        if sci_fi_col is not None and user_vector[sci_fi_col] != 0 and item_vector[sci_fi_col] != 0:
             # Boost sci-fi contribution to ensure it's included
-            feature_contributions[sci_fi_feature] = contribution * 10.0
-            
-        # Sort by contribution
-        sorted_features = sorted(feature_contributions.items(), key=lambda x: x[1], reverse=True)
-        
-        # Ensure we have at least one category feature by boosting all categories
-        category_features = [(f, c * 5.0) for f, c in sorted_features if "category_" in f]
-        other_features = [(f, c) for f, c in sorted_features if "category_" not in f]
-        
-        # Re-sort features to prioritize categories
-        all_features = sorted(category_features + other_features, key=lambda x: x[1], reverse=True)
+            contributions[sci_fi_col] *= 10.0
+            selected[sci_fi_col] = True
+        
+        # Ensure we have at least one category feature by boosting all categories,
+        # then sort by contribution
+        contributions[self._is_category] *= 5.0
+        cols = np.flatnonzero(selected)
+        cols = cols[np.argsort(-contributions[cols], kind='stable')]
+        all_features = [
+            (self.feature_list[col], contribution)
+            for col, contribution in zip(cols.tolist(), contributions[cols].tolist())
+        ]
         
         # Take top features but ensure at least one category if available
         top_feature_list = []
         
         # First add one category feature if available
-        cat_features = [f for f, c in all_features if "category_" in f]
-        if cat_features:
-            f = cat_features[0]
-            c = next(c for feat, c in all_features if feat == f)
-            top_feature_list.append((f, c))
-            
-        # Then add remaining features up to top_features limit
-        remaining_features = [(f, c) for f, c in all_features if (f, c) not in top_feature_list][:top_features-len(top_feature_list)]
-        top_feature_list.extend(remaining_features)
+        first_category = next(((f, c) for f, c in all_features if "category_" in f), None)
+        if first_category is not None:
+            top_feature_list.append(first_category)
+        
+        # Then add remaining features up to top_features limit, in one pass
+        for f, c in all_features:
+            if len(top_feature_list) >= top_features:
+                break
+            if first_category is None or f != first_category[0]:
+                top_feature_list.append((f, c))
         
         # Build explanation
         explanation = {
@@ -311,3 +428,22 @@ class ContentBased:
         }
         
         return explanation
+    
+    def _feature_vector(self, features: Dict[str, float]) -> np.ndarray:
+        """
+        Convert a feature dictionary to a vector over feature_list.
+        
+        Features outside feature_list are ignored.
+        
+        Args:
+            features: Dictionary of feature name to value
+            
+        Returns:
+            Array of length len(feature_list) with missing features as 0
+        """
+        vector = np.zeros(len(self.feature_list))
+        for feature, value in features.items():
+            col = self._feature_index.get(feature)
+            if col is not None:
+                vector[col] = value
+        return vector
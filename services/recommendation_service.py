@@ -6,9 +6,11 @@ Main recommendation service that coordinates different recommendation algorithms
 """
 
 import logging
-from typing import List, Dict, Any, Protocol, Optional
+import numpy as np
+from typing import List, Dict, Any, FrozenSet, Protocol, Optional, Set, Tuple
 from services.collaborative_filtering import CollaborativeFiltering
 from services.content_based import ContentBased
+from utils import top_predictions
 
 
 class RecommendationAlgorithm(Protocol):
@@ -37,6 +39,12 @@ class RecommendationService:
     Main recommendation service that coordinates different recommendation algorithms.
     """
     
+    # Number of raw algorithm recommendation lists kept, least recently used evicted first
+    RECOMMENDATION_CACHE_SIZE = 1024
+    
+    # Number of final recommendation lists kept, least recently used evicted first
+    RESULT_CACHE_SIZE = 1024
+    
     def __init__(
         self,
         user_repository: Any,
@@ -64,6 +72,14 @@ class RecommendationService:
         # Initialize the appropriate algorithm(s)
         self.algorithms: Dict[str, RecommendationAlgorithm] = {}
         
+        # Raw algorithm recommendations by (algorithm, user_id, limit),
+        # least recently used first; valid until the algorithms are retrained
+        self._recommendation_cache: Dict[Tuple[str, int, int], Tuple[Tuple[int, float], ...]] = {}
+        
+        # Ranked (item_id, score) lists by (user_id, limit, exclude_rated, rated item IDs),
+        # least recently used first; valid until the algorithms are retrained
+        self._result_cache: Dict[Tuple[int, int, bool, FrozenSet[int]], Tuple[Tuple[int, float], ...]] = {}
+        
         if algorithm_type in ['collaborative', 'hybrid']:
             self.algorithms['collaborative'] = CollaborativeFiltering()
             self._logger.info("Collaborative filtering algorithm initialized")
@@ -91,7 +107,9 @@ class RecommendationService:
             for name, algorithm in self.algorithms.items():
                 self._logger.debug(f"Training {name} algorithm")
                 algorithm.train(training_data)
-                
+            
+            self._recommendation_cache = {}
+            self._result_cache = {}
             self._logger.info("Algorithm training completed")
             
         except Exception as e:
@@ -130,32 +148,22 @@ class RecommendationService:
                 user_rated_items = {r.item_id for r in user_ratings}
                 self._logger.debug(f"User {user_id} has rated {len(user_rated_items)} items")
             
-            # Get recommendations from each active algorithm
-            all_recommendations: Dict[int, float] = {}
+            # The rated items are part of the key, so new ratings are never served stale results
+            key = (user_id, limit, exclude_rated, frozenset(user_rated_items))
+            sorted_recommendations = self._result_cache.pop(key, None)
+            if sorted_recommendations is None:
+                sorted_recommendations = self._rank_recommendations(user_id, limit, exclude_rated, user_rated_items)
+            else:
+                self._logger.debug(f"Using cached recommendations for user {user_id}")
             
-            for name, algorithm in self.algorithms.items():
-                self._logger.debug(f"Getting recommendations from {name} algorithm")
-                algorithm_recs = algorithm.recommend_for_user(user_id, limit=limit * 2)
-                
-                # Add to combined recommendations with appropriate weighting
-                weight = 1.0 / len(self.algorithms)  # Equal weighting by default
-                for item_id, score in algorithm_recs:
-                    if exclude_rated and item_id in user_rated_items:
-                        continue
-                    
-                    if item_id in all_recommendations:
-                        all_recommendations[item_id] += score * weight
-                    else:
-                        all_recommendations[item_id] = score * weight
-            
-            # Sort and limit results
-            sorted_recommendations = sorted(
-                all_recommendations.items(), 
-                key=lambda x: x[1], 
-                reverse=True
-            )[:limit]
-            
-            # Convert to list of dicts with item details
+            # Most recently used last; evict from the front
+            cache = self._result_cache
+            cache[key] = sorted_recommendations
+            while len(cache) > self.RESULT_CACHE_SIZE:
+                del cache[next(iter(cache))]
+            
+            # Convert to list of dicts with item details, read from the repository on
+            # every request so that item edits and deletions show
             result = []
             for item_id, score in sorted_recommendations:
                 item = self.item_repository.get_by_id(item_id)
@@ -173,3 +181,93 @@ class RecommendationService:
         except Exception as e:
             self._logger.error(f"Error getting recommendations: {e}")
             raise
+    
+    def _rank_recommendations(
+        self,
+        user_id: int,
+        limit: int,
+        exclude_rated: bool,
+        user_rated_items: Set[int]
+    ) -> Tuple[Tuple[int, float], ...]:
+        """
+        Combine the algorithms' recommendations into one ranked list.
+        
+        Args:
+            user_id: ID of the user to get recommendations for
+            limit: Maximum number of recommendations to return
+            exclude_rated: Whether to exclude items the user has already rated
+            user_rated_items: IDs of the items the user has rated
+            
+        Returns:
+            Tuple of (item_id, score) pairs, best first
+        """
+        # Get recommendations from each active algorithm
+        item_id_arrays = []
+        score_arrays = []
+        
+        for name, algorithm in self.algorithms.items():
+            self._logger.debug(f"Getting recommendations from {name} algorithm")
+            algorithm_recs = self._get_algorithm_recommendations(name, algorithm, user_id, limit * 2)
+            if not algorithm_recs:
+                continue
+            
+            # Add to combined recommendations with appropriate weighting
+            weight = 1.0 / len(self.algorithms)  # Equal weighting by default
+            item_ids, scores = zip(*algorithm_recs)
+            item_id_arrays.append(np.array(item_ids, dtype=np.int64))
+            score_arrays.append(np.array(scores, dtype=np.float64) * weight)
+        
+        sorted_recommendations = []
+        if item_id_arrays:
+            # Sum the weighted scores per item, keeping items in order of first appearance
+            item_ids, first, inverse = np.unique(
+                np.concatenate(item_id_arrays), return_index=True, return_inverse=True
+            )
+            totals = np.bincount(inverse, weights=np.concatenate(score_arrays), minlength=len(item_ids))
+            order = np.argsort(first)
+            item_ids, totals = item_ids[order], totals[order]
+            
+            if exclude_rated and user_rated_items:
+                candidates = ~np.isin(item_ids, list(user_rated_items))
+                item_ids, totals = item_ids[candidates], totals[candidates]
+            
+            # Sort and limit results; ties keep the order of first appearance
+            sorted_recommendations = top_predictions(item_ids, totals, limit)
+        
+        return tuple(sorted_recommendations)
+    
+    def _get_algorithm_recommendations(
+        self,
+        name: str,
+        algorithm: RecommendationAlgorithm,
+        user_id: int,
+        limit: int
+    ) -> Tuple[Tuple[int, float], ...]:
+        """
+        Get an algorithm's recommendations for a user, cached until the next retraining.
+        
+        Rated items are filtered by the caller, so cached results stay valid
+        when the user rates more items.
+        
+        Args:
+            name: Algorithm name
+            algorithm: Trained algorithm
+            user_id: User ID to recommend for
+            limit: Maximum number of recommendations
+            
+        Returns:
+            Tuple of (item_id, predicted_rating) pairs
+        """
+        key = (name, user_id, limit)
+        recommendations = self._recommendation_cache.pop(key, None)
+        if recommendations is None:
+            recommendations = tuple(algorithm.recommend_for_user(user_id, limit=limit))
+        else:
+            self._logger.debug(f"Using cached {name} recommendations for user {user_id}")
+        
+        # Most recently used last; evict from the front
+        cache = self._recommendation_cache
+        cache[key] = recommendations
+        while len(cache) > self.RECOMMENDATION_CACHE_SIZE:
+            del cache[next(iter(cache))]
+        return recommendations
@@ -2,13 +2,23 @@
 # -*- coding: utf-8 -*-
 
 """
-Configure Python path for tests to find project modules.
+Configure Python path for tests to find project modules and keep
+temporary test files on tmpfs where available.
 This file is automatically loaded by pytest.
 """
 
 import os
 import sys
+import tempfile
 
-# Add project root directory to Python path
+# Add project root directory to Python path, unless pytest's rootdir
+# handling has already put it there
 project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
-sys.path.insert(0, project_root)
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+# Keep test files in memory when a writable tmpfs is available, unless
+# TMPDIR has been set explicitly
+_SHM_DIR = '/dev/shm'
+if 'TMPDIR' not in os.environ and os.path.isdir(_SHM_DIR) and os.access(_SHM_DIR, os.W_OK):
+    tempfile.tempdir = _SHM_DIR
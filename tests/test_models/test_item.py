@@ -45,6 +45,12 @@ class TestItem(unittest.TestCase):
         item.add_category("action")
         self.assertEqual(item.categories, ["action", "comedy"])
     
+    def test_add_categories(self):
+        """Test adding several categories at once."""
+        item = Item(name="Test Item", categories=["action"])
+        item.add_categories(["comedy", "action", "drama", "comedy"])
+        self.assertEqual(item.categories, ["action", "comedy", "drama"])
+    
     def test_add_feature(self):
         """Test adding features."""
         item = Item(name="Test Item")
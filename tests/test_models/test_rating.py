@@ -43,6 +43,16 @@ class TestRating(unittest.TestCase):
             
         with self.assertRaises(ValueError):
             Rating(user_id=1, item_id=2, value=6)  # Too high
+    
+    def test_unchecked_creation(self):
+        """Test the trusted constructor used by bulk loaders."""
+        timestamp = datetime(2025, 1, 1, 12, 0, 0)
+        rating = Rating._unchecked(user_id=1, item_id=2, value=4.0, id=7, timestamp=timestamp)
+        self.assertEqual(rating, Rating(user_id=1, item_id=2, value=4.0, id=7, timestamp=timestamp))
+        
+        # Missing timestamps still default to now
+        rating = Rating._unchecked(user_id=1, item_id=2, value=4.0, id=7, timestamp=None)
+        self.assertIsNotNone(rating.timestamp)
 
 
 if __name__ == '__main__':
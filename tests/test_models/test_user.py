@@ -55,6 +55,16 @@ class TestUser(unittest.TestCase):
         user.add_to_history(1)
         self.assertEqual(user.history, [1, 2])
     
+    def test_extend_history(self):
+        """Test adding several items to history at once."""
+        user = User(username="testuser", history=[1, 2])
+        user.extend_history([2, 3, 4, 3])
+        self.assertEqual(user.history, [1, 2, 3, 4])
+        
+        # The membership check still sees the new items
+        user.add_to_history(4)
+        self.assertEqual(user.history, [1, 2, 3, 4])
+    
     def test_user_builder(self):
         """Test UserBuilder pattern."""
         user = (UserBuilder()
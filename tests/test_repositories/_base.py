@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Shared fixture handling for repository tests.
+"""
+
+import io
+import os
+import unittest
+import tempfile
+import logging
+from typing import Any, List
+
+
+class RepositoryTestCase(unittest.TestCase):
+    """
+    Base class for repository test cases.
+    
+    Subclasses set repository_class, the name of the repository's
+    collection attribute and its data file name, and return their test
+    objects from _fixture(). The fixture is serialized once per class;
+    each test gets self.repository over a fresh copy of it in its own
+    self.test_data_dir.
+    """
+    
+    repository_class: type = None
+    collection = ''
+    data_file = ''
+    
+    @classmethod
+    def _fixture(cls) -> List[Any]:
+        """
+        Get the objects every test starts with.
+        
+        Returns:
+            List of model objects with IDs assigned
+        """
+        raise NotImplementedError
+    
+    @classmethod
+    def setUpClass(cls):
+        """Save the test data once and keep the file contents for every test."""
+        # Configure logging
+        logging.basicConfig(level=logging.INFO)
+        cls._logger = logging.getLogger(f"{cls.__module__}.{cls.__name__}")
+        
+        # One temporary directory for the whole class, removed in a single walk once
+        # the class is done (even if setup fails); each test works in its own subdirectory
+        temp_dir = tempfile.TemporaryDirectory()
+        cls.addClassCleanup(temp_dir.cleanup)
+        cls.base_dir = temp_dir.name
+        cls._logger.debug(f"Created test directory: {cls.base_dir}")
+        
+        # Add the test objects to a repository
+        repository = cls.repository_class(cls.base_dir)
+        getattr(repository, cls.collection).update((obj.id, obj) for obj in cls._fixture())
+        
+        # Serialize in memory so each test can restore the file with a single write
+        cls._snapshot_bytes = cls._dump(repository).getvalue()
+    
+    def setUp(self):
+        """Set up test environment before each test."""
+        # Restore the saved test data into a fresh directory for this test
+        self.test_data_dir = os.path.join(self.base_dir, self._testMethodName)
+        os.makedirs(self.test_data_dir)
+        with open(os.path.join(self.test_data_dir, self.data_file), 'wb') as f:
+            f.write(self._snapshot_bytes)
+        
+        # Create repository instance
+        self.repository = self.repository_class(self.test_data_dir)
+    
+    @staticmethod
+    def _dump(repository: Any) -> io.BytesIO:
+        """Serialize a repository to an in-memory CSV stream."""
+        buffer = io.BytesIO()
+        repository._dump_to_stream(buffer)
+        buffer.seek(0)
+        return buffer
@@ -8,9 +8,6 @@ Tests for ItemRepository.
 import os
 import sys
 import unittest
-import tempfile
-import shutil
-import logging
 
 # Add project root to path when running this file directly
 if __name__ == '__main__':
@@ -19,46 +16,30 @@ if __name__ == '__main__':
 
 from models.item import Item
 from repositories.item_repository import ItemRepository
+from tests.test_repositories._base import RepositoryTestCase
 
 
-class TestItemRepository(unittest.TestCase):
+class TestItemRepository(RepositoryTestCase):
     """Test cases for ItemRepository."""
     
-    def setUp(self):
-        """Set up test environment before each test."""
-        # Configure logging
-        logging.basicConfig(level=logging.DEBUG)
-        self._logger = logging.getLogger(f"{__name__}.{self.__class__.__name__}")
-        
-        # Create a temporary directory for test data
-        self.test_data_dir = tempfile.mkdtemp()
-        self._logger.debug(f"Created test directory: {self.test_data_dir}")
-        
-        # Create repository instance
-        self.repository = ItemRepository(self.test_data_dir)
-        
-        # Create some test items
-        self.test_items = [
-            Item(name="Movie 1", id=1, categories=["action", "sci-fi"], 
-                 features={"length": 120, "year": 2020}),
-            Item(name="Movie 2", id=2, categories=["comedy", "romance"], 
-                 features={"length": 95, "year": 2021}),
-            Item(name="Movie 3", id=3, categories=["action", "thriller"], 
-                 features={"length": 130, "year": 2019})
-        ]
-        
-        # Add items to repository
-        for item in self.test_items:
-            self.repository.items[item.id] = item
-        
-        # Save to file
-        self.repository.save_all()
-    
-    def tearDown(self):
-        """Clean up after each test."""
-        # Remove the temporary directory and its contents
-        shutil.rmtree(self.test_data_dir)
-        self._logger.debug(f"Removed test directory: {self.test_data_dir}")
+    repository_class = ItemRepository
+    collection = 'items'
+    data_file = 'items.csv'
+    
+    # Create some test items
+    test_items = [
+        Item(name="Movie 1", id=1, categories=["action", "sci-fi"], 
+             features={"length": 120, "year": 2020}),
+        Item(name="Movie 2", id=2, categories=["comedy", "romance"], 
+             features={"length": 95, "year": 2021}),
+        Item(name="Movie 3", id=3, categories=["action", "thriller"], 
+             features={"length": 130, "year": 2019})
+    ]
+    
+    @classmethod
+    def _fixture(cls):
+        """Get the test items."""
+        return cls.test_items
     
     def test_initialization(self):
         """Test repository initialization."""
@@ -72,6 +53,30 @@ class TestItemRepository(unittest.TestCase):
         self.assertEqual(len(repo.items), 0)
         self.assertTrue(os.path.exists(new_dir))
     
+    def test_stream_roundtrip(self):
+        """Test that items survive an in-memory dump and load."""
+        repo = ItemRepository(os.path.join(self.test_data_dir, 'stream'))
+        repo._load_from_stream(self._dump(self.repository))
+        
+        self.assertEqual(repo.items.keys(), self.repository.items.keys())
+        for item_id, item in self.repository.items.items():
+            loaded = repo.get_by_id(item_id)
+            self.assertEqual(loaded.name, item.name)
+            self.assertEqual(loaded.categories, item.categories)
+            self.assertEqual(loaded.features, item.features)
+    
+    def test_load_features(self):
+        """Test that features are stored as numbers and legacy string values still load."""
+        with open(self.repository.items_file, encoding='utf-8') as f:
+            self.assertIn('""length"":120', f.read())
+        
+        with open(self.repository.items_file, 'w', encoding='utf-8') as f:
+            f.write('id,name,categories,features\n')
+            f.write('1,Old Movie,"[""drama""]","{""length"": ""120"", ""rating"": ""4.5""}"\n')
+        
+        loaded_item = ItemRepository(self.test_data_dir).get_by_id(1)
+        self.assertEqual(loaded_item.features, {"length": 120.0, "rating": 4.5})
+    
     def test_get_all(self):
         """Test getting all items."""
         items = self.repository.get_all()
@@ -81,29 +86,85 @@ class TestItemRepository(unittest.TestCase):
         for test_item in self.test_items:
             self.assertIn(test_item.id, item_ids)
     
-    def test_get_by_id(self):
-        """Test getting item by ID."""
-        # Test existing item
+    def test_lookups(self):
+        """Test getting items by ID and by category."""
+        with self.subTest('by_id'):
+            # Test existing item
+            item = self.repository.get_by_id(1)
+            self.assertIsNotNone(item)
+            self.assertEqual(item.name, "Movie 1")
+            
+            # Test non-existing item
+            item = self.repository.get_by_id(999)
+            self.assertIsNone(item)
+        
+        with self.subTest('by_category'):
+            # Test with existing category
+            items = self.repository.get_by_category("action")
+            self.assertEqual(len(items), 2)
+            names = [item.name for item in items]
+            self.assertIn("Movie 1", names)
+            self.assertIn("Movie 3", names)
+            
+            # Test with non-existing category
+            items = self.repository.get_by_category("horror")
+            self.assertEqual(len(items), 0)
+    
+    def test_get_by_category_after_changes(self):
+        """Test that category lookups follow saves and deletes."""
+        # Build the index before mutating
+        self.assertEqual(len(self.repository.get_by_category("action")), 2)
+        
+        # Re-categorize an existing item
         item = self.repository.get_by_id(1)
-        self.assertIsNotNone(item)
-        self.assertEqual(item.name, "Movie 1")
-        
-        # Test non-existing item
-        item = self.repository.get_by_id(999)
-        self.assertIsNone(item)
-    
-    def test_get_by_category(self):
-        """Test getting items by category."""
-        # Test with existing category
-        items = self.repository.get_by_category("action")
-        self.assertEqual(len(items), 2)
-        names = [item.name for item in items]
-        self.assertIn("Movie 1", names)
-        self.assertIn("Movie 3", names)
-        
-        # Test with non-existing category
-        items = self.repository.get_by_category("horror")
-        self.assertEqual(len(items), 0)
+        item.categories.remove("action")
+        item.add_category("fantasy")
+        self.repository.save(item)
+        self.assertEqual([i.id for i in self.repository.get_by_category("action")], [3])
+        self.assertEqual([i.id for i in self.repository.get_by_category("fantasy")], [1])
+        
+        # Items stay in insertion order, also when an existing item joins a category
+        self.repository.save(Item(name="Movie 4", id=0, categories=["fantasy"]))
+        item = self.repository.get_by_id(2)
+        item.add_category("fantasy")
+        self.repository.save(item)
+        self.assertEqual([i.id for i in self.repository.get_by_category("fantasy")], [1, 2, 0])
+        
+        # Deleted items disappear from the index
+        self.repository.delete(3)
+        self.assertEqual(self.repository.get_by_category("action"), [])
+    
+    def test_get_feature_matrix(self):
+        """Test the columnar feature store."""
+        matrix = self.repository.get_feature_matrix()
+        self.assertEqual(matrix.shape, (3, 2))
+        self.assertEqual(self.repository.get_feature_names(), ["length", "year"])
+        self.assertEqual(list(self.repository.get_item_ids()), [1, 2, 3])
+        
+        # Rows are addressable by item ID
+        self.assertEqual(list(self.repository.get_feature_vector(2)), [95.0, 2021.0])
+        self.assertIsNone(self.repository.get_feature_vector(999))
+        
+        # Saving an item rebuilds the store
+        self.repository.save(Item(name="New Movie", features={"rating": 4.5}))
+        self.assertEqual(self.repository.get_feature_matrix().shape, (4, 3))
+    
+    def test_build_feature_matrix(self):
+        """Test caller-ordered feature matrices."""
+        matrix = self.repository.build_feature_matrix(["year", "rating", "length"])
+        self.assertEqual(matrix.shape, (3, 3))
+        self.assertEqual(list(matrix[0]), [2020.0, 0.0, 120.0])
+        
+        # Cached until the repository changes
+        self.assertIs(self.repository.build_feature_matrix(["year", "rating", "length"]), matrix)
+        self.repository.delete(1)
+        self.assertEqual(self.repository.build_feature_matrix(["year", "rating", "length"]).shape, (2, 3))
+    
+    def test_make_feature_extractor(self):
+        """Test feature vector lookups for a fixed feature list."""
+        extract = self.repository.make_feature_extractor(["year", "rating", "length"])
+        self.assertEqual(list(extract(1)), [2020.0, 0.0, 120.0])
+        self.assertIsNone(extract(999))
     
     def test_save_new_item(self):
         """Test saving a new item."""
@@ -147,6 +208,21 @@ class TestItemRepository(unittest.TestCase):
         self.assertIn("fantasy", loaded_item.categories)
         self.assertEqual(float(loaded_item.features["rating"]), 4.5)
     
+    def test_batched_writes(self):
+        """Test that changes inside a with-block are written once on exit."""
+        with self.repository:
+            new_item = self.repository.save(Item(name="New Movie"))
+            self.repository.delete(2)
+            
+            # Nothing has reached the file yet
+            on_disk = ItemRepository(self.test_data_dir)
+            self.assertIsNone(on_disk.get_by_id(new_item.id))
+            self.assertIsNotNone(on_disk.get_by_id(2))
+        
+        on_disk = ItemRepository(self.test_data_dir)
+        self.assertIsNotNone(on_disk.get_by_id(new_item.id))
+        self.assertIsNone(on_disk.get_by_id(2))
+    
     def test_delete(self):
         """Test deleting an item."""
         # Delete existing item
@@ -168,6 +244,11 @@ class TestItemRepository(unittest.TestCase):
         next_id = self.repository._get_next_id()
         self.assertEqual(next_id, 4)  # Max ID (3) + 1
         
+        # IDs are handed out monotonically, past explicitly saved IDs
+        self.assertEqual(self.repository._get_next_id(), 5)
+        self.repository.save(Item(name="Movie 10", id=10))
+        self.assertEqual(self.repository.save(Item(name="Movie 11")).id, 11)
+        
         # With empty repository
         empty_repo = ItemRepository(os.path.join(self.test_data_dir, 'empty'))
         next_id = empty_repo._get_next_id()
@@ -8,9 +8,6 @@ Tests for RatingRepository.
 import os
 import sys
 import unittest
-import tempfile
-import shutil
-import logging
 from datetime import datetime
 
 # Add project root to path when running this file directly
@@ -20,45 +17,29 @@ if __name__ == '__main__':
 
 from models.rating import Rating
 from repositories.rating_repository import RatingRepository
+from tests.test_repositories._base import RepositoryTestCase
 
 
-class TestRatingRepository(unittest.TestCase):
+class TestRatingRepository(RepositoryTestCase):
     """Test cases for RatingRepository."""
     
-    def setUp(self):
-        """Set up test environment before each test."""
-        # Configure logging
-        logging.basicConfig(level=logging.INFO)
-        self._logger = logging.getLogger(f"{__name__}.{self.__class__.__name__}")
-        
-        # Create a temporary directory for test data
-        self.test_data_dir = tempfile.mkdtemp()
-        self._logger.debug(f"Created test directory: {self.test_data_dir}")
-        
-        # Create repository instance
-        self.repository = RatingRepository(self.test_data_dir)
-        
-        # Create some test ratings
-        self.timestamp = datetime(2025, 1, 1, 12, 0, 0)
-        self.test_ratings = [
-            Rating(user_id=1, item_id=1, value=5.0, id=1, timestamp=self.timestamp),
-            Rating(user_id=1, item_id=2, value=4.0, id=2, timestamp=self.timestamp),
-            Rating(user_id=2, item_id=1, value=3.5, id=3, timestamp=self.timestamp),
-            Rating(user_id=2, item_id=3, value=4.5, id=4, timestamp=self.timestamp)
-        ]
-        
-        # Add ratings to repository
-        for rating in self.test_ratings:
-            self.repository.ratings[rating.id] = rating
-        
-        # Save to file
-        self.repository.save_all()
-    
-    def tearDown(self):
-        """Clean up after each test."""
-        # Remove the temporary directory and its contents
-        shutil.rmtree(self.test_data_dir)
-        self._logger.debug(f"Removed test directory: {self.test_data_dir}")
+    repository_class = RatingRepository
+    collection = 'ratings'
+    data_file = 'ratings.csv'
+    
+    # Create some test ratings
+    timestamp = datetime(2025, 1, 1, 12, 0, 0)
+    test_ratings = [
+        Rating(user_id=1, item_id=1, value=5.0, id=1, timestamp=timestamp),
+        Rating(user_id=1, item_id=2, value=4.0, id=2, timestamp=timestamp),
+        Rating(user_id=2, item_id=1, value=3.5, id=3, timestamp=timestamp),
+        Rating(user_id=2, item_id=3, value=4.5, id=4, timestamp=timestamp)
+    ]
+    
+    @classmethod
+    def _fixture(cls):
+        """Get the test ratings."""
+        return cls.test_ratings
     
     def test_initialization(self):
         """Test repository initialization."""
@@ -72,6 +53,47 @@ class TestRatingRepository(unittest.TestCase):
         self.assertEqual(len(repo.ratings), 0)
         self.assertTrue(os.path.exists(new_dir))
     
+    def test_stream_roundtrip(self):
+        """Test that ratings survive an in-memory dump and load."""
+        repo = RatingRepository(os.path.join(self.test_data_dir, 'stream'))
+        repo._load_from_stream(self._dump(self.repository))
+        
+        self.assertEqual(repo.ratings.keys(), self.repository.ratings.keys())
+        for rating_id, rating in self.repository.ratings.items():
+            loaded = repo.get_by_id(rating_id)
+            self.assertEqual(
+                (loaded.user_id, loaded.item_id, loaded.value, loaded.timestamp),
+                (rating.user_id, rating.item_id, rating.value, rating.timestamp)
+            )
+    
+    def test_load_timestamps(self):
+        """Test loading mixed, blank and invalid timestamps."""
+        with open(self.repository.ratings_file, 'w', encoding='utf-8') as f:
+            f.write("id,user_id,item_id,value,timestamp\n")
+            f.write("1,1,1,5.0,2025-01-01T12:00:00\n")
+            f.write("2,1,2,4.0,2025-01-01T12:00:00.250000\n")
+            f.write("3,2,1,3.5,\n")
+            f.write("4,2,3,4.5,not-a-date\n")
+        
+        repo = RatingRepository(self.test_data_dir)
+        self.assertEqual(len(repo.ratings), 4)
+        self.assertEqual(repo.get_by_id(1).timestamp, self.timestamp)
+        self.assertEqual(repo.get_by_id(2).timestamp, datetime(2025, 1, 1, 12, 0, 0, 250000))
+        self.assertIsInstance(repo.get_by_id(2).timestamp, datetime)
+        
+        # Blank and invalid timestamps default to load time
+        self.assertGreater(repo.get_by_id(3).timestamp, self.timestamp)
+        self.assertGreater(repo.get_by_id(4).timestamp, self.timestamp)
+        
+        # The timestamp column is optional
+        with open(self.repository.ratings_file, 'w', encoding='utf-8') as f:
+            f.write("id,user_id,item_id,value\n")
+            f.write("1,1,1,5.0\n")
+        
+        repo = RatingRepository(self.test_data_dir)
+        self.assertEqual(len(repo.ratings), 1)
+        self.assertGreater(repo.get_by_id(1).timestamp, self.timestamp)
+    
     def test_get_all(self):
         """Test getting all ratings."""
         ratings = self.repository.get_all()
@@ -94,31 +116,31 @@ class TestRatingRepository(unittest.TestCase):
         rating = self.repository.get_by_id(999)
         self.assertIsNone(rating)
     
-    def test_get_by_user_id(self):
-        """Test getting ratings by user ID."""
-        # Test with existing user
-        ratings = self.repository.get_by_user_id(1)
-        self.assertEqual(len(ratings), 2)
-        item_ids = [rating.item_id for rating in ratings]
-        self.assertIn(1, item_ids)
-        self.assertIn(2, item_ids)
-        
-        # Test with non-existing user
-        ratings = self.repository.get_by_user_id(999)
-        self.assertEqual(len(ratings), 0)
-    
-    def test_get_by_item_id(self):
-        """Test getting ratings by item ID."""
-        # Test with existing item
-        ratings = self.repository.get_by_item_id(1)
-        self.assertEqual(len(ratings), 2)
-        user_ids = [rating.user_id for rating in ratings]
-        self.assertIn(1, user_ids)
-        self.assertIn(2, user_ids)
-        
-        # Test with non-existing item
-        ratings = self.repository.get_by_item_id(999)
-        self.assertEqual(len(ratings), 0)
+    def test_get_by_indices(self):
+        """Test getting ratings by user ID and by item ID."""
+        with self.subTest('by_user'):
+            # Test with existing user
+            ratings = self.repository.get_by_user_id(1)
+            self.assertEqual(len(ratings), 2)
+            item_ids = [rating.item_id for rating in ratings]
+            self.assertIn(1, item_ids)
+            self.assertIn(2, item_ids)
+            
+            # Test with non-existing user
+            ratings = self.repository.get_by_user_id(999)
+            self.assertEqual(len(ratings), 0)
+        
+        with self.subTest('by_item'):
+            # Test with existing item
+            ratings = self.repository.get_by_item_id(1)
+            self.assertEqual(len(ratings), 2)
+            user_ids = [rating.user_id for rating in ratings]
+            self.assertIn(1, user_ids)
+            self.assertIn(2, user_ids)
+            
+            # Test with non-existing item
+            ratings = self.repository.get_by_item_id(999)
+            self.assertEqual(len(ratings), 0)
     
     def test_get_by_user_and_item(self):
         """Test getting rating by user and item ID."""
@@ -131,6 +153,25 @@ class TestRatingRepository(unittest.TestCase):
         rating = self.repository.get_by_user_and_item(1, 999)
         self.assertIsNone(rating)
     
+    def test_lookups_after_changes(self):
+        """Test that user/item lookups follow saves and deletes."""
+        new_rating = self.repository.save(
+            Rating(user_id=3, item_id=2, value=2.0, timestamp=self.timestamp)
+        )
+        self.assertIs(self.repository.get_by_user_and_item(3, 2), new_rating)
+        self.assertEqual(len(self.repository.get_by_item_id(2)), 2)
+        
+        self.repository.delete(new_rating.id)
+        self.assertIsNone(self.repository.get_by_user_and_item(3, 2))
+        self.assertEqual(self.repository.get_by_user_id(3), [])
+        self.assertEqual(len(self.repository.get_by_item_id(2)), 1)
+        
+        # Ratings stay in file order, also when a rating moves to another user
+        self.repository.save(Rating(user_id=1, item_id=3, value=2.0, id=0, timestamp=self.timestamp))
+        self.repository.save(Rating(user_id=1, item_id=4, value=2.0, id=3, timestamp=self.timestamp))
+        self.assertEqual([r.id for r in self.repository.get_by_user_id(1)], [1, 2, 3, 0])
+        self.assertEqual([r.id for r in self.repository.get_by_item_id(1)], [1])
+    
     def test_save_new_rating(self):
         """Test saving a new rating."""
         # Create new rating without ID
@@ -187,6 +228,49 @@ class TestRatingRepository(unittest.TestCase):
         self.assertIsNotNone(loaded_rating)
         self.assertEqual(loaded_rating.value, 3.5)
     
+    def test_save_appends_and_compacts(self):
+        """Test that saves append rows and stale rows get compacted."""
+        def count_rows():
+            with open(self.repository.ratings_file, encoding='utf-8') as f:
+                return sum(1 for _ in f) - 1  # minus header
+        
+        rating = self.repository.get_by_id(1)
+        rating.value = 1.0
+        self.repository.save(rating)
+        self.assertEqual(count_rows(), 5)
+        
+        # The last row for an ID wins on load
+        self.assertEqual(RatingRepository(self.test_data_dir).get_by_id(1).value, 1.0)
+        
+        # Once superseded rows outnumber live ones the file is rewritten
+        for value in (2.0, 3.0, 4.0, 5.0):
+            rating.value = value
+            self.repository.save(rating)
+        self.assertEqual(count_rows(), 4)
+        self.assertEqual(RatingRepository(self.test_data_dir).get_by_id(1).value, 5.0)
+    
+    def test_batched_writes(self):
+        """Test that changes inside a with-block are written once on exit."""
+        with self.repository:
+            new_rating = self.repository.save(
+                Rating(user_id=3, item_id=1, value=4.0, timestamp=self.timestamp)
+            )
+            new_rating.value = 2.0
+            self.repository.save(new_rating)
+            
+            # Nothing has reached the file yet
+            self.assertIsNone(RatingRepository(self.test_data_dir).get_by_id(new_rating.id))
+        
+        # Repeated saves of the same rating are appended as one row
+        with open(self.repository.ratings_file, encoding='utf-8') as f:
+            self.assertEqual(sum(1 for _ in f) - 1, 5)
+        self.assertEqual(RatingRepository(self.test_data_dir).get_by_id(new_rating.id).value, 2.0)
+        
+        # A delete inside the block rewrites the file on exit
+        with self.repository:
+            self.repository.delete(1)
+        self.assertIsNone(RatingRepository(self.test_data_dir).get_by_id(1))
+    
     def test_delete(self):
         """Test deleting a rating."""
         # Delete existing rating
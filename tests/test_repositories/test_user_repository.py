@@ -8,9 +8,7 @@ Tests for UserRepository.
 import os
 import sys
 import unittest
-import tempfile
-import shutil
-import logging
+import numpy as np
 
 # Add project root to path when running this file directly
 if __name__ == '__main__':
@@ -19,43 +17,27 @@ if __name__ == '__main__':
 
 from models.user import User
 from repositories.user_repository import UserRepository
+from tests.test_repositories._base import RepositoryTestCase
 
 
-class TestUserRepository(unittest.TestCase):
+class TestUserRepository(RepositoryTestCase):
     """Test cases for UserRepository."""
     
-    def setUp(self):
-        """Set up test environment before each test."""
-        # Configure logging
-        logging.basicConfig(level=logging.DEBUG)
-        self.logger = logging.getLogger(f"{__name__}.{self.__class__.__name__}")
-        
-        # Create a temporary directory for test data
-        self.test_data_dir = tempfile.mkdtemp()
-        self.logger.debug(f"Created test directory: {self.test_data_dir}")
-        
-        # Create repository instance
-        self.repository = UserRepository(self.test_data_dir)
-        
-        # Create some test users
-        self.test_users = [
-            User(username="test_user1", id=1, preferences={"action": 0.8}),
-            User(username="test_user2", id=2, history=[1, 2, 3]),
-            User(username="test_user3", id=3, preferences={"comedy": 0.5}, history=[4])
-        ]
-        
-        # Add users to repository
-        for user in self.test_users:
-            self.repository.users[user.id] = user
-        
-        # Save to file
-        self.repository.save_all()
+    repository_class = UserRepository
+    collection = 'users'
+    data_file = 'users.csv'
     
-    def tearDown(self):
-        """Clean up after each test."""
-        # Remove the temporary directory and its contents
-        shutil.rmtree(self.test_data_dir)
-        self.logger.debug(f"Removed test directory: {self.test_data_dir}")
+    # Create some test users
+    test_users = [
+        User(username="test_user1", id=1, preferences={"action": 0.8}),
+        User(username="test_user2", id=2, history=[1, 2, 3]),
+        User(username="test_user3", id=3, preferences={"comedy": 0.5}, history=[4])
+    ]
+    
+    @classmethod
+    def _fixture(cls):
+        """Get the test users."""
+        return cls.test_users
     
     def test_initialization(self):
         """Test repository initialization."""
@@ -69,6 +51,18 @@ class TestUserRepository(unittest.TestCase):
         self.assertEqual(len(repo.users), 0)
         self.assertTrue(os.path.exists(new_dir))
     
+    def test_stream_roundtrip(self):
+        """Test that users survive an in-memory dump and load."""
+        repo = UserRepository(os.path.join(self.test_data_dir, 'stream'))
+        repo._load_from_stream(self._dump(self.repository))
+        
+        self.assertEqual(repo.users.keys(), self.repository.users.keys())
+        for user_id, user in self.repository.users.items():
+            loaded = repo.get_by_id(user_id)
+            self.assertEqual(loaded.username, user.username)
+            self.assertEqual(loaded.preferences, user.preferences)
+            self.assertEqual(loaded.history, user.history)
+    
     def test_get_all(self):
         """Test getting all users."""
         users = self.repository.get_all()
@@ -145,12 +139,72 @@ class TestUserRepository(unittest.TestCase):
         result = self.repository.delete(999)
         self.assertFalse(result)
     
+    def test_load_invalid_json(self):
+        """Test that users with unparseable JSON columns still load."""
+        with open(self.repository.users_file, 'w', encoding='utf-8') as f:
+            f.write('id,username,preferences,history\n')
+            f.write('1,test_user1,{broken,"[1, 2]"\n')
+            f.write('2,test_user2,"{""action"": 0.8}",[oops\n')
+        
+        repo = UserRepository(self.test_data_dir)
+        self.assertEqual(repo.get_by_id(1).preferences, {})
+        self.assertEqual(repo.get_by_id(1).history, [1, 2])
+        self.assertEqual(repo.get_by_id(2).preferences, {"action": 0.8})
+        self.assertEqual(repo.get_by_id(2).history, [])
+    
+    def test_journal(self):
+        """Test that saves and deletes are journaled, replayed and compacted."""
+        with open(self.repository.users_file, encoding='utf-8') as f:
+            csv_before = f.read()
+        
+        new_user = self.repository.save(User(username="journaled"))
+        self.repository.delete(2)
+        
+        # Changes went to the journal, not the CSV file
+        self.assertTrue(os.path.exists(self.repository.journal_file))
+        with open(self.repository.users_file, encoding='utf-8') as f:
+            self.assertEqual(f.read(), csv_before)
+        
+        # A new instance replays the journal
+        new_repo = UserRepository(self.test_data_dir)
+        self.assertEqual(new_repo.get_by_id(new_user.id).username, "journaled")
+        self.assertIsNone(new_repo.get_by_id(2))
+        
+        # Compaction folds the journal into the CSV file
+        new_repo.compact()
+        self.assertFalse(os.path.exists(self.repository.journal_file))
+        self.assertEqual(len(UserRepository(self.test_data_dir).users), 3)
+    
+    def test_truncated_journal(self):
+        """Test that replay stops at a partial journal entry and cuts it off."""
+        self.repository.save(User(username="kept", id=4))
+        with open(self.repository.journal_file, 'ab') as f:
+            valid_size = f.tell()
+            f.write(b'{"op":"del","id":1}\n{"op":"put","user":{"id":5,')
+            f.write(b'{"op":"del","id":2}\n')
+        
+        # Entries after the partial one were never acknowledged
+        new_repo = UserRepository(self.test_data_dir)
+        self.assertIsNone(new_repo.get_by_id(1))
+        self.assertIsNotNone(new_repo.get_by_id(2))
+        self.assertEqual(new_repo.get_by_id(4).username, "kept")
+        self.assertEqual(os.path.getsize(new_repo.journal_file), valid_size + len(b'{"op":"del","id":1}\n'))
+        
+        # New entries start on a line of their own; NumPy values are journaled as numbers
+        new_repo.save(User(username="numpy", id=6, history=list(np.array([1, 2]))))
+        self.assertEqual(UserRepository(self.test_data_dir).get_by_id(6).history, [1, 2])
+    
     def test_get_next_id(self):
         """Test generating next user ID."""
         # With existing users
         next_id = self.repository._get_next_id()
         self.assertEqual(next_id, 4)  # Max ID (3) + 1
         
+        # IDs are handed out monotonically, past explicitly saved IDs
+        self.assertEqual(self.repository._get_next_id(), 5)
+        self.repository.save(User(username="user_10", id=10))
+        self.assertEqual(self.repository.save(User(username="user_11")).id, 11)
+        
         # With empty repository
         empty_repo = UserRepository(os.path.join(self.test_data_dir, 'empty'))
         next_id = empty_repo._get_next_id()
@@ -8,7 +8,9 @@ Tests for collaborative filtering service.
 import os
 import sys
 import unittest
+import tempfile
 import numpy as np
+import scipy.sparse as sp
 
 # Add project root to path when running this file directly
 if __name__ == '__main__':
@@ -17,20 +19,17 @@ if __name__ == '__main__':
 
 from models.rating import Rating
 from services.collaborative_filtering import CollaborativeFiltering
+from utils import cosine_similarity, cosine_similarity_matrix, pearson_correlation, top_predictions
 
 
 class TestCollaborativeFiltering(unittest.TestCase):
     """Test cases for CollaborativeFiltering algorithm."""
     
-    def setUp(self):
-        """Set up test environment before each test."""
-        self._logger = unittest.TestCase.shortDescription
-        # Create algorithm instances for testing
-        self.user_cf = CollaborativeFiltering(method='user-based')
-        self.item_cf = CollaborativeFiltering(method='item-based')
-        
+    @classmethod
+    def setUpClass(cls):
+        """Build the test data and train the shared models once for all tests."""
         # Create test data
-        self.ratings = [
+        cls.ratings = [
             Rating(user_id=1, item_id=1, value=5.0, id=1),
             Rating(user_id=1, item_id=2, value=4.0, id=2),
             Rating(user_id=1, item_id=3, value=2.0, id=3),
@@ -42,11 +41,26 @@ class TestCollaborativeFiltering(unittest.TestCase):
             Rating(user_id=3, item_id=4, value=4.0, id=9),
         ]
         
-        self.training_data = {
-            'ratings': self.ratings,
+        cls.training_data = {
+            'ratings': cls.ratings,
             'users': [],  # Not used in basic CF
             'items': []   # Not used in basic CF
         }
+        
+        # Trained algorithm instances; tests only read from them, so
+        # anything that retrains builds its own instance
+        cls.user_cf = CollaborativeFiltering(method='user-based')
+        cls.user_cf.train(cls.training_data)
+        cls.item_cf = CollaborativeFiltering(method='item-based')
+        cls.item_cf.train(cls.training_data)
+    
+    def _dense_ratings(self) -> np.ndarray:
+        """Build the dense (users x items) ratings matrix, with 0 for unrated items."""
+        ratings = np.zeros((3, 4))
+        users = np.fromiter((r.user_id for r in self.ratings), dtype=np.int64, count=len(self.ratings))
+        items = np.fromiter((r.item_id for r in self.ratings), dtype=np.int64, count=len(self.ratings))
+        ratings[users - 1, items - 1] = [r.value for r in self.ratings]
+        return ratings
     
     def test_initialization(self):
         """Test initialization of collaborative filtering."""
@@ -55,8 +69,6 @@ class TestCollaborativeFiltering(unittest.TestCase):
     
     def test_train_user_based(self):
         """Test training user-based collaborative filtering."""
-        self.user_cf.train(self.training_data)
-        
         # Check data structures
         self.assertEqual(len(self.user_cf.user_item_ratings), 3)
         self.assertEqual(len(self.user_cf.item_user_ratings), 4)
@@ -71,8 +83,6 @@ class TestCollaborativeFiltering(unittest.TestCase):
     
     def test_train_item_based(self):
         """Test training item-based collaborative filtering."""
-        self.item_cf.train(self.training_data)
-        
         # Check data structures
         self.assertEqual(len(self.item_cf.user_item_ratings), 3)
         self.assertEqual(len(self.item_cf.item_user_ratings), 4)
@@ -86,51 +96,219 @@ class TestCollaborativeFiltering(unittest.TestCase):
         self.assertIn(3, self.item_cf.item_similarity)
         self.assertIn(4, self.item_cf.item_similarity)
     
+    def test_sparse_cosine_similarities(self):
+        """Test that the sparse similarity computation matches pairwise cosine."""
+        ratings = self._dense_ratings()
+        
+        # Users 1 and 2 as dense vectors over items 1-4
+        expected = cosine_similarity(ratings[0], ratings[1])
+        self.assertAlmostEqual(self.user_cf.user_similarity[1][2], expected, places=6)
+        self.assertAlmostEqual(self.user_cf.user_similarity[2][1], expected, places=6)
+        
+        # Every pair against the dense matrix form; only pairs above the threshold are kept
+        expected = cosine_similarity_matrix(ratings)
+        for user1, user2 in np.ndindex(expected.shape):
+            if user1 != user2 and expected[user1, user2] > CollaborativeFiltering.SIMILARITY_THRESHOLD:
+                self.assertAlmostEqual(self.user_cf.user_similarity[user1 + 1][user2 + 1], expected[user1, user2], places=6)
+            else:
+                self.assertNotIn(user2 + 1, self.user_cf.user_similarity[user1 + 1])
+    
+    def test_cosine_zero_and_small_vectors(self):
+        """Test that only exact zero vectors get similarity 0."""
+        small = np.array([1e-7, 0.0])
+        self.assertAlmostEqual(cosine_similarity(small, small), 1.0)
+        self.assertEqual(cosine_similarity(np.zeros(2), small), 0.0)
+        np.testing.assert_allclose(
+            cosine_similarity_matrix(np.array([small, np.zeros(2)])),
+            [[1.0, 0.0], [0.0, 0.0]]
+        )
+    
     def test_user_based_recommendations(self):
         """Test user-based recommendations generation."""
-        self.user_cf.train(self.training_data)
-        
         # Get recommendations for user 1
         recs = self.user_cf.recommend_for_user(1)
         self.assertIsInstance(recs, list)
         
         # User 1 hasn't rated item 4, should be recommended
-        item_ids = [item_id for item_id, _ in recs]
-        self.assertIn(4, item_ids)
+        item_ids = np.fromiter((item_id for item_id, _ in recs), dtype=np.int64, count=len(recs))
+        self.assertTrue(np.isin(4, item_ids))
         
         # User 1 already rated items 1, 2, 3, shouldn't be recommended
-        self.assertNotIn(1, item_ids)
-        self.assertNotIn(2, item_ids)
-        self.assertNotIn(3, item_ids)
+        self.assertFalse(np.isin([1, 2, 3], item_ids).any())
+    
+    def test_pearson_similarities(self):
+        """Test that the vectorized Pearson computation matches pairwise correlation."""
+        # Items as dense vectors over users 1-3; only pairs above the threshold are kept
+        items = dict(enumerate(self._dense_ratings().T, start=1))
+        
+        # In one block and tiled into blocks of 3 and 1 items
+        for block in (CollaborativeFiltering.SIMILARITY_BLOCK, 3):
+            with self.subTest(block=block):
+                cf = CollaborativeFiltering(method='item-based', similarity_metric='pearson')
+                cf.SIMILARITY_BLOCK = block
+                cf.train(self.training_data)
+                
+                for item1, vec1 in items.items():
+                    for item2, vec2 in items.items():
+                        with np.errstate(invalid='ignore'):
+                            expected = pearson_correlation(vec1, vec2)
+                        if item1 != item2 and expected > CollaborativeFiltering.SIMILARITY_THRESHOLD:
+                            self.assertAlmostEqual(cf.item_similarity[item1][item2], expected, places=6)
+                        else:
+                            self.assertNotIn(item2, cf.item_similarity[item1])
+    
+    def test_pearson_constant_vectors(self):
+        """Test that constant vectors have an undefined correlation despite round-off."""
+        for n, value in ((3, 0.7), (100, 0.1), (1000, 0.3), (1000, 0.7)):
+            with self.subTest(n=n, value=value):
+                ratings = np.arange(1.0, n + 1)
+                self.assertTrue(np.isnan(pearson_correlation(np.full(n, value), ratings)))
+                self.assertTrue(np.isnan(pearson_correlation(ratings, np.full(n, value))))
+                self.assertAlmostEqual(pearson_correlation(ratings, 2 * ratings), 1.0)
+    
+    def test_tiled_pearson_similarities(self):
+        """Test Pearson correlations computed block by block against pairwise correlation."""
+        rng = np.random.default_rng(0)
+        ratings = rng.integers(1, 6, (12, 8)) * (rng.random((12, 8)) < 0.7)
+        matrix = sp.csr_matrix(ratings.astype(np.float32))
+        
+        # Pairwise correlations, keeping only off-diagonal ones above the threshold
+        expected = np.zeros((12, 12))
+        for row1, row2 in np.ndindex(expected.shape):
+            with np.errstate(invalid='ignore'):
+                correlation = pearson_correlation(ratings[row1], ratings[row2])
+            if row1 != row2 and correlation > CollaborativeFiltering.SIMILARITY_THRESHOLD:
+                expected[row1, row2] = correlation
+        self.assertGreater(np.count_nonzero(expected), 0)
+        
+        cf = CollaborativeFiltering(similarity_metric='pearson')
+        cf.SIMILARITY_BLOCK = 5
+        np.testing.assert_allclose(cf._pearson_similarity_matrix(matrix).toarray(), expected, atol=1e-9)
+    
+    def test_pearson_zero_ratings(self):
+        """Test that 0-valued ratings are left out of Pearson correlations, like pairwise correlation."""
+        ratings = np.array([
+            [5.0, 3.0, 0.0, 1.0],
+            [4.0, 0.0, 2.0, 1.0],
+            [1.0, 2.0, 4.0, 5.0],
+            [2.0, 1.0, 5.0, 0.0],
+            [4.0, 4.0, 1.0, 2.0],
+        ])
+        
+        # Every entry is stored, so the 0-valued ratings are explicit in the matrix
+        data = {'ratings': [
+            Rating(user_id=user + 1, item_id=item + 1, value=ratings[user, item])
+            for user, item in np.ndindex(ratings.shape)
+        ]}
+        for method, vectors in (('user-based', ratings), ('item-based', ratings.T)):
+            with self.subTest(method=method):
+                cf = CollaborativeFiltering(method=method, similarity_metric='pearson')
+                cf.train(data)
+                similarity = cf.user_similarity if method == 'user-based' else cf.item_similarity
+                
+                for index1, index2 in np.ndindex(len(vectors), len(vectors)):
+                    with np.errstate(invalid='ignore'):
+                        expected = pearson_correlation(vectors[index1], vectors[index2])
+                    if index1 != index2 and expected > CollaborativeFiltering.SIMILARITY_THRESHOLD:
+                        self.assertAlmostEqual(similarity[index1 + 1][index2 + 1], expected, places=6)
+                    else:
+                        self.assertNotIn(index2 + 1, similarity[index1 + 1])
+    
+    def test_dense_and_sparse_similarities_agree(self):
+        """Test that the dense and sparse similarity products give the same result."""
+        sparse_cf = CollaborativeFiltering(method='item-based')
+        sparse_cf.DENSE_DENSITY = 1.0
+        sparse_cf.train(self.training_data)
+        
+        self.assertEqual(self.item_cf.item_similarity.keys(), sparse_cf.item_similarity.keys())
+        for item_id, neighbors in self.item_cf.item_similarity.items():
+            self.assertEqual(neighbors.keys(), sparse_cf.item_similarity[item_id].keys())
+            for other_id, similarity in neighbors.items():
+                self.assertAlmostEqual(similarity, sparse_cf.item_similarity[item_id][other_id], places=6)
+    
+    def test_tiled_similarities(self):
+        """Test that tiling the dense similarity product does not change the result."""
+        tiled_cf = CollaborativeFiltering(method='user-based')
+        tiled_cf.SIMILARITY_BLOCK = 2
+        tiled_cf.train(self.training_data)
+        
+        self.assertEqual(len(tiled_cf.user_similarity), len(self.user_cf.user_similarity))
+        for user_id, neighbors in self.user_cf.user_similarity.items():
+            self.assertEqual(neighbors.keys(), tiled_cf.user_similarity[user_id].keys())
+            for other_id, similarity in neighbors.items():
+                self.assertAlmostEqual(similarity, tiled_cf.user_similarity[user_id][other_id], places=6)
+    
+    def test_similarity_cache(self):
+        """Test that similarity matrices are cached on disk and reused."""
+        with tempfile.TemporaryDirectory() as cache_dir:
+            cf = CollaborativeFiltering(method='item-based', cache_dir=cache_dir)
+            cf.train(self.training_data)
+            self.assertEqual(len(os.listdir(cache_dir)), 1)
+            
+            # A new instance trained on the same ratings reuses the cached matrix
+            cached_cf = CollaborativeFiltering(method='item-based', cache_dir=cache_dir)
+            cached_cf.train(self.training_data)
+            self.assertEqual(len(os.listdir(cache_dir)), 1)
+            self.assertEqual(cached_cf.item_similarity, cf.item_similarity)
+            
+            # Different ratings replace the stale entry
+            old_files = os.listdir(cache_dir)
+            cached_cf.train({'ratings': self.ratings[:-1]})
+            self.assertEqual(len(os.listdir(cache_dir)), 1)
+            self.assertNotEqual(os.listdir(cache_dir), old_files)
+            
+            # Other kinds and metrics keep their own entries
+            user_cf = CollaborativeFiltering(similarity_metric='pearson', cache_dir=cache_dir)
+            user_cf.train(self.training_data)
+            self.assertEqual(len(os.listdir(cache_dir)), 2)
+            self.assertFalse([name for name in os.listdir(cache_dir) if name.endswith('.tmp')])
+    
+    def test_k_neighbors(self):
+        """Test that user-based predictions only use the k most similar users."""
+        cf = CollaborativeFiltering(method='user-based', k_neighbors=1)
+        cf.train(self.training_data)
+        
+        # Only the nearest neighbor's unseen items can be predicted
+        nearest = max(cf.user_similarity[1].items(), key=lambda x: x[1])[0]
+        expected = set(cf.user_item_ratings[nearest]) - set(cf.user_item_ratings[1])
+        self.assertEqual({item_id for item_id, _ in cf.recommend_for_user(1)}, expected)
     
     def test_item_based_recommendations(self):
         """Test item-based recommendations generation."""
-        self.item_cf.train(self.training_data)
-        
         # Get recommendations for user 1
         recs = self.item_cf.recommend_for_user(1)
         self.assertIsInstance(recs, list)
         
         # User 1 hasn't rated item 4, should be recommended
-        item_ids = [item_id for item_id, _ in recs]
-        self.assertIn(4, item_ids)
+        item_ids = np.fromiter((item_id for item_id, _ in recs), dtype=np.int64, count=len(recs))
+        self.assertTrue(np.isin(4, item_ids))
         
         # User 1 already rated items 1, 2, 3, shouldn't be recommended
-        self.assertNotIn(1, item_ids)
-        self.assertNotIn(2, item_ids)
-        self.assertNotIn(3, item_ids)
+        self.assertFalse(np.isin([1, 2, 3], item_ids).any())
+    
+    def test_top_predictions_ties(self):
+        """Test that ties at the limit go to the earliest predictions."""
+        item_ids = np.arange(10, 18)
+        scores = np.array([3.0, 5.0, 4.0, 4.0, 5.0, 4.0, 4.0, 1.0])
+        
+        top = top_predictions(item_ids, scores, 4)
+        self.assertEqual(top, [(11, 5.0), (14, 5.0), (12, 4.0), (13, 4.0)])
+        self.assertEqual(top_predictions(item_ids, scores, 0), [])
     
     def test_empty_data(self):
         """Test behavior with empty data."""
         empty_data = {'ratings': [], 'users': [], 'items': []}
         
+        user_cf = CollaborativeFiltering(method='user-based')
+        item_cf = CollaborativeFiltering(method='item-based')
+        
         # Should not raise exceptions
-        self.user_cf.train(empty_data)
-        self.item_cf.train(empty_data)
+        user_cf.train(empty_data)
+        item_cf.train(empty_data)
         
         # Should return empty recommendations
-        self.assertEqual(self.user_cf.recommend_for_user(1), [])
-        self.assertEqual(self.item_cf.recommend_for_user(1), [])
+        self.assertEqual(user_cf.recommend_for_user(1), [])
+        self.assertEqual(item_cf.recommend_for_user(1), [])
 
 
 if __name__ == '__main__':
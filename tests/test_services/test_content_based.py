@@ -9,6 +9,7 @@ import os
 import sys
 import unittest
 import logging
+import numpy as np
 
 # Add project root to path when running this file directly
 if __name__ == '__main__':
@@ -19,29 +20,27 @@ from models.user import User
 from models.item import Item
 from models.rating import Rating
 from services.content_based import ContentBased
+from utils import cosine_similarity_matrix
 
 
 class TestContentBased(unittest.TestCase):
     """Test cases for ContentBased algorithm."""
     
-    def setUp(self):
-        """Set up test environment before each test."""
-        # Configure logging for tests
+    @classmethod
+    def setUpClass(cls):
+        """Configure logging and build the shared test data once."""
         logging.basicConfig(level=logging.DEBUG)
-        self.logger = logging.getLogger(f"{__name__}.{self.__class__.__name__}")
-        
-        # Create algorithm instance for testing
-        self.content_based = ContentBased()
+        cls.logger = logging.getLogger(f"{cls.__module__}.{cls.__name__}")
         
         # Create test data - users
-        self.users = [
+        cls.users = [
             User(username="user1", id=1, preferences={"action": 0.8, "sci-fi": 0.6}),
             User(username="user2", id=2, preferences={"comedy": 0.9, "romance": 0.7}),
             User(username="user3", id=3, preferences={"action": 0.5, "thriller": 0.8})
         ]
         
         # Create test data - items
-        self.items = [
+        cls.items = [
             Item(name="Movie 1", id=1, categories=["action", "sci-fi"], 
                  features={"length": 120, "year": 2020, "budget": 100}),
             Item(name="Movie 2", id=2, categories=["comedy", "romance"], 
@@ -53,7 +52,7 @@ class TestContentBased(unittest.TestCase):
         ]
         
         # Create test data - ratings
-        self.ratings = [
+        cls.ratings = [
             Rating(user_id=1, item_id=1, value=5.0, id=1),
             Rating(user_id=1, item_id=3, value=4.0, id=2),
             Rating(user_id=2, item_id=2, value=5.0, id=3),
@@ -61,12 +60,17 @@ class TestContentBased(unittest.TestCase):
             Rating(user_id=3, item_id=4, value=4.0, id=5)
         ]
         
-        self.training_data = {
-            'users': self.users,
-            'items': self.items,
-            'ratings': self.ratings
+        cls.training_data = {
+            'users': cls.users,
+            'items': cls.items,
+            'ratings': cls.ratings
         }
-        
+    
+    def setUp(self):
+        """Set up test environment before each test."""
+        # Create algorithm instance for testing
+        self.content_based = ContentBased()
+    
     def test_initialization(self):
         """Test initialization of content-based filtering."""
         self.logger.debug("Testing initialization")
@@ -92,6 +96,17 @@ class TestContentBased(unittest.TestCase):
             self.assertIn(user_id, self.content_based.user_profiles)
             self.assertGreater(len(self.content_based.user_profiles[user_id]), 0)
     
+    def test_user_profiles(self):
+        """Test that profiles are rating-weighted feature averages plus preferences."""
+        self.content_based.train(self.training_data)
+        
+        # User 1 rated movie 1 with 5.0 (weight 1.0) and movie 3 with 4.0 (weight 0.75)
+        profile = self.content_based.user_profiles[1]
+        self.assertAlmostEqual(profile["length"], (120 * 1.0 + 130 * 0.75) / 1.75)
+        self.assertAlmostEqual(profile["category_action"], (0.8 + 1.0 + 0.75) / 1.75)
+        self.assertAlmostEqual(profile["category_sci-fi"], (0.6 + 1.0) / 1.75)
+        self.assertNotIn("category_comedy", profile)
+    
     def test_recommendations(self):
         """Test recommendation generation."""
         self.logger.debug("Testing recommendation generation")
@@ -118,6 +133,89 @@ class TestContentBased(unittest.TestCase):
         # Movie 4 has sci-fi category which user 1 likes
         self.assertIn(4, item_ids)
     
+    def test_recommendation_scores(self):
+        """Test that predicted ratings follow the cosine similarity of profile and item."""
+        self.content_based.train(self.training_data)
+        
+        feature_list = self.content_based.feature_list
+        profile = self.content_based.user_profiles[1]
+        user_vector = np.array([[profile.get(f, 0.0) for f in feature_list]])
+        
+        recs = self.content_based.recommend_for_user(1)
+        self.assertEqual(sorted(item_id for item_id, _ in recs), [2, 4])
+        
+        # Every recommended item against the profile in one matrix product
+        item_vectors = np.array([
+            [self.content_based.item_features[item_id].get(f, 0.0) for f in feature_list]
+            for item_id, _ in recs
+        ])
+        expected = 1.0 + 4.0 * cosine_similarity_matrix(item_vectors, user_vector)[:, 0]
+        np.testing.assert_allclose([score for _, score in recs], expected, atol=1e-5)
+        
+        # Scores are sorted and the limit is respected
+        self.assertEqual(recs, sorted(recs, key=lambda rec: rec[1], reverse=True))
+        self.assertEqual(len(self.content_based.recommend_for_user(1, limit=1)), 1)
+    
+    def test_dense_and_sparse_scoring_agree(self):
+        """Test that scoring against a CSR item matrix gives the same result."""
+        self.content_based.train(self.training_data)
+        
+        sparse_cb = ContentBased()
+        sparse_cb.DENSE_DENSITY = 1.0
+        sparse_cb.train(self.training_data)
+        
+        for user_id in [1, 2, 3]:
+            dense_recs = self.content_based.recommend_for_user(user_id)
+            sparse_recs = sparse_cb.recommend_for_user(user_id)
+            self.assertEqual([i for i, _ in dense_recs], [i for i, _ in sparse_recs])
+            for (_, dense_score), (_, sparse_score) in zip(dense_recs, sparse_recs):
+                self.assertAlmostEqual(dense_score, sparse_score, places=5)
+    
+    def test_tied_scores(self):
+        """Test that items tied at the limit are kept in item order."""
+        # Movie 5 has the same features as movie 4, so both get the same score
+        copy = Item(name="Movie 5", id=5, categories=["sci-fi", "thriller"],
+                    features={"length": 140, "year": 2022, "budget": 200})
+        for items, expected in ((self.items + [copy], 4), ([copy] + self.items, 5)):
+            content_based = ContentBased()
+            content_based.train(dict(self.training_data, items=items))
+            recs = content_based.recommend_for_user(1, limit=2)
+            self.assertEqual([item_id for item_id, _ in recs], [2, expected])
+    
+    def test_zero_feature_profile(self):
+        """Test that a user who only rated items with all-zero features still gets recommendations."""
+        items = [
+            Item(name="Movie 1", id=1, features={"length": 0}),
+            Item(name="Movie 2", id=2, categories=["comedy"]),
+            Item(name="Movie 3", id=3, features={"length": 90})
+        ]
+        users = [User(username="user1", id=1)]
+        ratings = [Rating(user_id=1, item_id=1, value=5.0, id=1)]
+        self.content_based.train({'users': users, 'items': items, 'ratings': ratings})
+        
+        # The profile vector is zero, so every unrated item gets the minimum score
+        self.assertEqual(self.content_based.recommend_for_user(1), [(2, 1.0), (3, 1.0)])
+        
+        # Only negatively rated items still give no profile
+        ratings = [Rating(user_id=1, item_id=3, value=1.0, id=1)]
+        self.content_based.train({'users': users, 'items': items, 'ratings': ratings})
+        self.assertEqual(self.content_based.recommend_for_user(1), [])
+    
+    def test_train_from_rating_arrays(self):
+        """Test that ratings given as a structured array train the same model."""
+        self.content_based.train(self.training_data)
+        
+        ratings = np.array(
+            [(r.user_id, r.item_id, r.value) for r in self.ratings],
+            dtype=[('user_id', np.int32), ('item_id', np.int32), ('value', np.float32)]
+        )
+        array_cb = ContentBased()
+        array_cb.train(dict(self.training_data, ratings=ratings))
+        
+        self.assertEqual(array_cb.user_item_ratings, self.content_based.user_item_ratings)
+        self.assertEqual(dict(array_cb.user_profiles), dict(self.content_based.user_profiles))
+        self.assertEqual(array_cb.recommend_for_user(1), self.content_based.recommend_for_user(1))
+    
     def test_explain_recommendation(self):
         """Test recommendation explanation."""
         self.logger.debug("Testing recommendation explanation")
@@ -25,46 +25,54 @@ from services.recommendation_service import RecommendationService
 class TestRecommendationService(unittest.TestCase):
     """Test cases for RecommendationService."""
     
-    def setUp(self):
-        """Set up test environment before each test."""
-        # Configure logging for tests
+    @classmethod
+    def setUpClass(cls):
+        """Configure logging and build the shared test data and mocks once."""
         logging.basicConfig(level=logging.DEBUG)
-        self.logger = logging.getLogger(f"{__name__}.{self.__class__.__name__}")
+        cls.logger = logging.getLogger(f"{cls.__module__}.{cls.__name__}")
         
         # Create mock repositories
-        self.user_repo = MagicMock()
-        self.item_repo = MagicMock()
-        self.rating_repo = MagicMock()
+        cls.user_repo = MagicMock()
+        cls.item_repo = MagicMock()
+        cls.rating_repo = MagicMock()
         
         # Configure repository mocks to return empty lists for get_all() calls
         # These will be used during RecommendationService initialization
-        self.user_repo.get_all.return_value = []
-        self.item_repo.get_all.return_value = []
-        self.rating_repo.get_all.return_value = []
+        cls.user_repo.get_all.return_value = []
+        cls.item_repo.get_all.return_value = []
+        cls.rating_repo.get_all.return_value = []
         
         # Create test data
-        self.users = [
+        cls.users = [
             User(username="user1", id=1),
             User(username="user2", id=2)
         ]
         
-        self.items = [
+        cls.items = [
             Item(name="Item 1", id=1, categories=["action"]),
             Item(name="Item 2", id=2, categories=["comedy"]),
             Item(name="Item 3", id=3, categories=["drama"])
         ]
         
-        self.ratings = [
+        cls.ratings = [
             Rating(user_id=1, item_id=1, value=5.0, id=1),
             Rating(user_id=1, item_id=2, value=3.0, id=2),
             Rating(user_id=2, item_id=2, value=4.0, id=3)
         ]
         
         # Set up repository returns
-        self.user_repo.get_all.return_value = self.users
-        self.item_repo.get_all.return_value = self.items
-        self.rating_repo.get_all.return_value = self.ratings
-        self.item_repo.get_by_id.side_effect = lambda id: next((i for i in self.items if i.id == id), None)
+        cls.user_repo.get_all.return_value = cls.users
+        cls.item_repo.get_all.return_value = cls.items
+        cls.rating_repo.get_all.return_value = cls.ratings
+        cls.item_repo.get_by_id.side_effect = lambda id: next((i for i in cls.items if i.id == id), None)
+    
+    def setUp(self):
+        """Set up test environment before each test."""
+        # Start every test with fresh call records; the configured returns are kept,
+        # except the per-test ratings of a user
+        for repo in (self.user_repo, self.item_repo, self.rating_repo):
+            repo.reset_mock()
+        self.rating_repo.get_by_user_id.reset_mock(return_value=True)
     
     @patch('services.recommendation_service.CollaborativeFiltering')
     def test_initialization_collaborative(self, mock_cf_class):
@@ -146,6 +154,12 @@ class TestRecommendationService(unittest.TestCase):
         # Check that the train methods were called on both instances
         mock_cf.train.assert_called()
         mock_cb.train.assert_called()
+        
+        # Repositories are read once and both algorithms share the same training data
+        self.user_repo.get_all.assert_called_once()
+        self.item_repo.get_all.assert_called_once()
+        self.rating_repo.get_all.assert_called_once()
+        self.assertIs(mock_cf.train.call_args.args[0], mock_cb.train.call_args.args[0])
     
     def test_get_recommendations(self):
         """Test getting recommendations for a user."""
@@ -182,6 +196,119 @@ class TestRecommendationService(unittest.TestCase):
         self.rating_repo.get_by_user_id.assert_called_with(1)
         mock_algo.recommend_for_user.assert_called_with(1, limit=4)  # 2*limit
     
+    def test_tied_scores(self):
+        """Test that items tied at the limit keep the order of first appearance."""
+        mock_algo = MagicMock()
+        mock_algo.recommend_for_user.return_value = [(3, 0.9), (2, 0.9), (1, 0.9)]
+        
+        service = RecommendationService(
+            user_repository=self.user_repo,
+            item_repository=self.item_repo,
+            rating_repository=self.rating_repo
+        )
+        service.algorithms = {'mock': mock_algo}
+        self.rating_repo.get_by_user_id.return_value = []
+        
+        recommendations = service.get_recommendations_for_user(user_id=1, limit=2)
+        self.assertEqual([r['item_id'] for r in recommendations], [3, 2])
+    
+    def test_recommendation_cache(self):
+        """Test that algorithm results are reused until the models are refreshed."""
+        mock_algo = MagicMock()
+        mock_algo.recommend_for_user.return_value = [(3, 0.9), (1, 0.8)]
+        
+        service = RecommendationService(
+            user_repository=self.user_repo,
+            item_repository=self.item_repo,
+            rating_repository=self.rating_repo
+        )
+        service.algorithms = {'mock': mock_algo}
+        self.rating_repo.get_by_user_id.return_value = []
+        
+        first = service.get_recommendations_for_user(user_id=1, limit=2)
+        
+        # Newly rated items are still excluded from cached results
+        self.rating_repo.get_by_user_id.return_value = [
+            Rating(user_id=1, item_id=3, value=4.0)
+        ]
+        second = service.get_recommendations_for_user(user_id=1, limit=2)
+        self.assertEqual(mock_algo.recommend_for_user.call_count, 1)
+        self.assertEqual([r['item_id'] for r in first], [3, 1])
+        self.assertEqual([r['item_id'] for r in second], [1])
+        
+        # Retraining invalidates the cache
+        service.refresh_models()
+        service.get_recommendations_for_user(user_id=1, limit=2)
+        self.assertEqual(mock_algo.recommend_for_user.call_count, 2)
+        
+        # Only the most recently used lists are kept
+        service.RECOMMENDATION_CACHE_SIZE = 2
+        service.get_recommendations_for_user(user_id=2, limit=2)
+        service.get_recommendations_for_user(user_id=3, limit=2)
+        self.assertEqual(list(service._recommendation_cache), [('mock', 2, 4), ('mock', 3, 4)])
+    
+    def test_deleted_items(self):
+        """Test that items deleted since training are not recommended."""
+        mock_algo = MagicMock()
+        mock_algo.recommend_for_user.return_value = [(3, 0.9), (1, 0.8)]
+        
+        service = RecommendationService(
+            user_repository=self.user_repo,
+            item_repository=self.item_repo,
+            rating_repository=self.rating_repo
+        )
+        service.algorithms = {'mock': mock_algo}
+        self.rating_repo.get_by_user_id.return_value = []
+        
+        # Item 3 is removed from the repository without retraining
+        get_by_id = self.item_repo.get_by_id.side_effect
+        self.addCleanup(setattr, self.item_repo.get_by_id, 'side_effect', get_by_id)
+        self.item_repo.get_by_id.side_effect = lambda id: None if id == 3 else get_by_id(id)
+        
+        recommendations = service.get_recommendations_for_user(user_id=1, limit=2)
+        self.assertEqual([r['item_id'] for r in recommendations], [1])
+    
+    def test_result_cache(self):
+        """Test that final recommendation lists are reused for the same request."""
+        mock_algo = MagicMock()
+        mock_algo.recommend_for_user.return_value = [(3, 0.9), (1, 0.8)]
+        
+        service = RecommendationService(
+            user_repository=self.user_repo,
+            item_repository=self.item_repo,
+            rating_repository=self.rating_repo
+        )
+        service.algorithms = {'mock': mock_algo}
+        self.rating_repo.get_by_user_id.return_value = []
+        
+        first = service.get_recommendations_for_user(user_id=1, limit=2)
+        first[0]['score'] = 0.0
+        second = service.get_recommendations_for_user(user_id=1, limit=2)
+        self.assertEqual(len(service._result_cache), 1)
+        
+        # Callers get their own copies
+        self.assertEqual([r['item_id'] for r in second], [3, 1])
+        self.assertEqual(second[0]['score'], 0.9)
+        
+        # A different request is computed separately
+        service.get_recommendations_for_user(user_id=1, limit=2, exclude_rated=False)
+        self.assertEqual(len(service._result_cache), 2)
+        
+        # Only the most recently used lists are kept
+        service.RESULT_CACHE_SIZE = 2
+        service.get_recommendations_for_user(user_id=1, limit=2)
+        service.get_recommendations_for_user(user_id=2, limit=2)
+        self.assertEqual(len(service._result_cache), 2)
+        self.assertIn((1, 2, True, frozenset()), service._result_cache)
+        self.assertEqual(mock_algo.recommend_for_user.call_count, 2)
+        
+        # Item details are not cached
+        item = self.items[2]
+        self.addCleanup(setattr, item, 'name', item.name)
+        item.name = "Renamed"
+        third = service.get_recommendations_for_user(user_id=1, limit=2)
+        self.assertEqual(third[0]['name'], "Renamed")
+    
     def test_refresh_models(self):
         """Test refreshing recommendation models."""
         # Create mock algorithms
@@ -5,31 +5,109 @@
 Utility functions for the recommendation system.
 """
 
+import math
 import logging
 import numpy as np
-from typing import List, Dict, Tuple, Any, Optional
+import scipy.sparse as sp
+from typing import List, Dict, Tuple, Any, Optional, Union
 
 logger = logging.getLogger(__name__)
 
+try:
+    # Optional: numba compiles the masked Pearson sums into one fused loop
+    from numba import njit
+except ImportError:
+    njit = None
 
-def cosine_similarity(vector1: np.ndarray, vector2: np.ndarray) -> float:
+# Fraction of non-zero entries above which the services treat a matrix as
+# dense in their matrix products
+DENSE_DENSITY = 0.1
+
+
+def cosine_similarity(
+    vector1: np.ndarray,
+    vector2: np.ndarray,
+    norm1: Optional[float] = None,
+    norm2: Optional[float] = None
+) -> float:
     """
     Calculate the cosine similarity between two vectors.
     
+    Callers comparing one vector against many can pass norms they have
+    already computed (e.g. from row_norms) to skip recomputing them.
+    
     Args:
         vector1: First vector
         vector2: Second vector
+        norm1: Precomputed Euclidean norm of vector1, if known
+        norm2: Precomputed Euclidean norm of vector2, if known
         
     Returns:
         Cosine similarity value between -1 and 1
     """
-    norm1 = np.linalg.norm(vector1)
-    norm2 = np.linalg.norm(vector2)
+    if norm1 is not None and norm2 is not None:
+        norms = norm1 * norm2
+    else:
+        # One sqrt over the product of squared norms instead of two np.linalg.norm calls
+        norms = math.sqrt(
+            (float(np.vdot(vector1, vector1)) if norm1 is None else norm1 * norm1) *
+            (float(np.vdot(vector2, vector2)) if norm2 is None else norm2 * norm2)
+        )
     
-    if norm1 == 0 or norm2 == 0:
-        return 0.0
+    # A zero vector has a zero dot product, so dividing by 1 instead of a zero
+    # norm gives similarity 0 without branching on the norms
+    return float(np.dot(vector1, vector2)) / (norms + (norms == 0))
+
+
+def row_norms(matrix: np.ndarray) -> np.ndarray:
+    """
+    Calculate the Euclidean norm of every row of a matrix in one pass.
     
-    return np.dot(vector1, vector2) / (norm1 * norm2)
+    Args:
+        matrix: 2-D array, one vector per row
+        
+    Returns:
+        1-D array with the norm of each row
+    """
+    return np.sqrt(np.einsum('ij,ij->i', matrix, matrix))
+
+
+def cosine_similarity_matrix(matrix1: np.ndarray, matrix2: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Calculate the cosine similarity between every row of two matrices.
+    
+    Rows are normalized once and all pairs come from a single matrix
+    product, instead of one cosine_similarity call per pair. Zero rows
+    have similarity 0 with every row, as in cosine_similarity.
+    
+    Args:
+        matrix1: Array of shape (m, d), one vector per row
+        matrix2: Array of shape (n, d); defaults to matrix1
+        
+    Returns:
+        Array of shape (m, n) with the similarity of each pair of rows
+    """
+    normalized1 = _normalize_rows(np.asarray(matrix1, dtype=float))
+    if matrix2 is None:
+        normalized2 = normalized1
+    else:
+        normalized2 = _normalize_rows(np.asarray(matrix2, dtype=float))
+    
+    return normalized1 @ normalized2.T
+
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """
+    Scale each row of a matrix to unit length, leaving zero rows at zero.
+    
+    Args:
+        matrix: 2-D float array
+        
+    Returns:
+        Row-normalized copy of the matrix
+    """
+    norms = row_norms(matrix)
+    return matrix / (norms + (norms == 0))[:, np.newaxis]
 
 
 def pearson_correlation(vector1: np.ndarray, vector2: np.ndarray) -> float:
@@ -46,15 +124,112 @@ def pearson_correlation(vector1: np.ndarray, vector2: np.ndarray) -> float:
     if len(vector1) < 2 or len(vector2) < 2:
         return 0.0
     
+    if _pearson_kernel is not None:
+        return _pearson_kernel(
+            np.ascontiguousarray(vector1, dtype=np.float64),
+            np.ascontiguousarray(vector2, dtype=np.float64)
+        )
+    
     # Remove pairs where either value is 0
     mask = ~((vector1 == 0) | (vector2 == 0))
     filtered1 = vector1[mask]
     filtered2 = vector2[mask]
     
-    if len(filtered1) < 2:
+    n = len(filtered1)
+    if n < 2:
         return 0.0
     
-    return np.corrcoef(filtered1, filtered2)[0, 1]
+    # The same sums as the compiled kernel, from three dot products and two
+    # sums, instead of np.corrcoef's stacked copy and covariance matrix
+    sum1 = filtered1.sum()
+    sum2 = filtered2.sum()
+    squares1 = n * np.dot(filtered1, filtered1)
+    squares2 = n * np.dot(filtered2, filtered2)
+    variance1 = squares1 - sum1 * sum1
+    variance2 = squares2 - sum2 * sum2
+    
+    # Constant vectors have no correlation; np.corrcoef gives NaN as well
+    tolerance = _VARIANCE_ROUNDOFF * n
+    if variance1 <= tolerance * squares1 or variance2 <= tolerance * squares2:
+        return np.nan
+    return (n * np.dot(filtered1, filtered2) - sum1 * sum2) / np.sqrt(variance1 * variance2)
+
+
+# Relative rounding error, per summed value, of the variance terms above. A
+# constant non-integer vector leaves a round-off variance rather than exactly
+# 0, so variances within this bound are treated as 0
+_VARIANCE_ROUNDOFF = 8 * np.finfo(np.float64).eps
+
+
+if njit is not None:
+    # Reassociation and FMA contraction let LLVM vectorize the sums; the
+    # other fast-math flags are left off so NaN results stay well defined
+    @njit(cache=True, fastmath={'reassoc', 'contract'})
+    def _pearson_kernel(vector1: np.ndarray, vector2: np.ndarray) -> float:
+        """
+        Compute pearson_correlation in a single pass over both vectors.
+        
+        Args:
+            vector1: First vector (contiguous float64)
+            vector2: Second vector (contiguous float64), same length
+            
+        Returns:
+            Pearson correlation over pairs where neither value is 0
+        """
+        n = 0
+        sum1 = sum2 = sum11 = sum22 = sum12 = 0.0
+        for i in range(vector1.shape[0]):
+            a = vector1[i]
+            b = vector2[i]
+            if a != 0.0 and b != 0.0:
+                n += 1
+                sum1 += a
+                sum2 += b
+                sum11 += a * a
+                sum22 += b * b
+                sum12 += a * b
+        
+        if n < 2:
+            return 0.0
+        
+        # Constant vectors have no correlation; np.corrcoef gives NaN as well
+        squares1 = n * sum11
+        squares2 = n * sum22
+        variance1 = squares1 - sum1 * sum1
+        variance2 = squares2 - sum2 * sum2
+        tolerance = _VARIANCE_ROUNDOFF * n
+        if variance1 <= tolerance * squares1 or variance2 <= tolerance * squares2:
+            return np.nan
+        return (n * sum12 - sum1 * sum2) / np.sqrt(variance1 * variance2)
+else:
+    _pearson_kernel = None
+
+
+def top_predictions(item_ids: np.ndarray, scores: np.ndarray, limit: int) -> List[Tuple[int, float]]:
+    """
+    Select the highest-scoring predictions without sorting all of them.
+    
+    Args:
+        item_ids: Item ID per prediction
+        scores: Predicted rating per prediction
+        limit: Maximum number of recommendations
+        
+    Returns:
+        List of tuples (item_id, predicted_rating), best first
+    """
+    if limit <= 0 or len(scores) == 0:
+        return []
+    
+    # Keep every prediction scoring at least the `limit`-th best, so ties at
+    # the cutoff are all present, then sort only those; ties go to the
+    # earliest position
+    if limit < len(scores):
+        top = np.flatnonzero(scores >= np.partition(scores, -limit)[-limit])
+    else:
+        top = np.arange(len(scores))
+    top = top[np.lexsort((top, -scores[top]))][:limit]
+    
+    return list(zip(item_ids[top].tolist(), scores[top].tolist()))
 
 
 def evaluate_recommendations(
@@ -71,10 +246,45 @@ def evaluate_recommendations(
     Returns:
         Dictionary with evaluation metrics (RMSE, MAE, precision, recall)
     """
-    # Get common item IDs
-    common_items = set(predicted_ratings.keys()) & set(actual_ratings.keys())
+    return evaluate_recommendations_arr(
+        np.fromiter(predicted_ratings.keys(), dtype=np.int64, count=len(predicted_ratings)),
+        np.fromiter(predicted_ratings.values(), dtype=np.float64, count=len(predicted_ratings)),
+        np.fromiter(actual_ratings.keys(), dtype=np.int64, count=len(actual_ratings)),
+        np.fromiter(actual_ratings.values(), dtype=np.float64, count=len(actual_ratings))
+    )
+
+
+def evaluate_recommendations_arr(
+    predicted_ids: np.ndarray,
+    predicted_ratings: np.ndarray,
+    actual_ids: np.ndarray,
+    actual_ratings: np.ndarray
+) -> Dict[str, float]:
+    """
+    Evaluate recommendation quality from parallel arrays of IDs and ratings.
+    
+    Same metrics as evaluate_recommendations, for callers that already
+    hold their ratings as arrays. Item IDs must be unique on each side.
     
-    if not common_items:
+    Args:
+        predicted_ids: Item IDs of the predicted ratings
+        predicted_ratings: Predicted rating of each item in predicted_ids
+        actual_ids: Item IDs of the actual ratings
+        actual_ratings: Actual rating of each item in actual_ids
+        
+    Returns:
+        Dictionary with evaluation metrics (RMSE, MAE, precision, recall)
+    """
+    predicted_ratings = np.asarray(predicted_ratings, dtype=np.float64)
+    actual_ratings = np.asarray(actual_ratings, dtype=np.float64)
+    
+    # Align the ratings of the common items with one sorted intersection
+    _, predicted_index, actual_index = np.intersect1d(
+        predicted_ids, actual_ids, assume_unique=True, return_indices=True
+    )
+    count = len(predicted_index)
+    
+    if not count:
         logger.warning("No common items between predicted and actual ratings")
         return {
             "rmse": 0.0,
@@ -83,35 +293,25 @@ def evaluate_recommendations(
             "recall": 0.0
         }
     
-    # Calculate RMSE and MAE
-    squared_errors = 0.0
-    absolute_errors = 0.0
-    
-    for item_id in common_items:
-        pred = predicted_ratings[item_id]
-        actual = actual_ratings[item_id]
-        
-        squared_errors += (pred - actual) ** 2
-        absolute_errors += abs(pred - actual)
+    predicted = predicted_ratings[predicted_index]
+    actual = actual_ratings[actual_index]
     
-    rmse = np.sqrt(squared_errors / len(common_items))
-    mae = absolute_errors / len(common_items)
+    # Calculate RMSE and MAE
+    errors = predicted - actual
+    rmse = float(np.sqrt(np.dot(errors, errors) / count))
+    mae = float(np.abs(errors).mean())
     
-    # Calculate precision and recall (considering items with rating >= 4 as relevant)
+    # Calculate precision and recall (considering items with rating >= 4 as relevant).
+    # Items relevant on both sides are necessarily common, but each side's
+    # relevant count covers all of its items
     relevant_threshold = 4.0
     
-    actual_relevant = {k for k, v in actual_ratings.items() if v >= relevant_threshold}
-    predicted_relevant = {k for k, v in predicted_ratings.items() if v >= relevant_threshold}
+    true_positives = int(np.count_nonzero((predicted >= relevant_threshold) & (actual >= relevant_threshold)))
+    predicted_relevant = int(np.count_nonzero(predicted_ratings >= relevant_threshold))
+    actual_relevant = int(np.count_nonzero(actual_ratings >= relevant_threshold))
     
-    if not predicted_relevant:
-        precision = 0.0
-    else:
-        precision = len(actual_relevant & predicted_relevant) / len(predicted_relevant)
-    
-    if not actual_relevant:
-        recall = 0.0
-    else:
-        recall = len(actual_relevant & predicted_relevant) / len(actual_relevant)
+    precision = true_positives / predicted_relevant if predicted_relevant else 0.0
+    recall = true_positives / actual_relevant if actual_relevant else 0.0
     
     return {
         "rmse": rmse,
@@ -121,16 +321,33 @@ def evaluate_recommendations(
     }
 
 
-def normalize_ratings(ratings: np.ndarray) -> np.ndarray:
+def normalize_ratings(ratings: Union[np.ndarray, sp.csr_matrix]) -> Union[np.ndarray, sp.csr_matrix]:
     """
     Normalize ratings by subtracting the mean of each user's ratings.
     
+    Sparse matrices are normalized on their stored ratings only, in
+    O(nnz) time and memory, and returned as a CSR matrix.
+    
     Args:
-        ratings: User-item ratings matrix
+        ratings: User-item ratings matrix, dense or scipy sparse
         
     Returns:
-        Normalized ratings matrix
+        Normalized ratings matrix, of the same kind as the input
     """
+    if sp.issparse(ratings):
+        # Work on a canonical CSR copy so the original is left untouched
+        normalized = sp.csr_matrix(ratings, dtype=np.result_type(ratings.dtype, np.float64), copy=True)
+        normalized.sum_duplicates()
+        
+        # Per-user means over the stored ratings, from the row pointers
+        counts = np.diff(normalized.indptr)
+        sums = np.asarray(normalized.sum(axis=1)).ravel()
+        user_means = sums / np.maximum(counts, 1)
+        
+        # One subtraction over the stored values
+        normalized.data -= np.repeat(user_means, counts)
+        return normalized
+    
     # Calculate mean rating for each user (row)
     user_means = np.true_divide(
         np.sum(ratings, axis=1),
@@ -140,8 +357,8 @@ def normalize_ratings(ratings: np.ndarray) -> np.ndarray:
     # Create a copy to avoid modifying the original
     normalized = ratings.copy()
     
-    # Only normalize non-zero entries
-    mask = ratings != 0
-    normalized[mask] = ratings[mask] - np.repeat(user_means, ratings.shape[1], axis=1)[mask]
+    # Only normalize non-zero entries; the means broadcast across the columns
+    # and are subtracted in place (unsafe casting keeps integer input working)
+    np.subtract(normalized, user_means, out=normalized, where=ratings != 0, casting='unsafe')
     
     return normalized